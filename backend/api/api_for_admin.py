@@ -1,37 +1,44 @@
-from fastapi import APIRouter, HTTPException, Cookie, Depends, UploadFile, File, Form
-from sqlalchemy import select, delete
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, delete, update
+from typing import Literal
+import csv
+import io
+import json
 import os
 
-from backend.models.models import CategoryModel, ProductModel, UserModel
-from backend.schemas.category_schema import CategoryShema, ChangeCategoryNameSchema
-from backend.schemas.product_schema import ProductSchema, ChangeProductNameSchema, ChangeProductPriceSchema
-from backend.database.database import session_dep
-from backend.database.hash import security
+from backend.models.models import CategoryModel, ProductModel, CartItemModel, OrderLineModel
+from backend.schemas.category_schema import CategoryShema, ChangeCategoryNameSchema, AddCategoryResponseSchema
+from backend.schemas.product_schema import ProductSchema, ChangeProductNameSchema, ChangeProductPriceSchema, AddProductResponseSchema, ChangeProductImageResponseSchema
+from backend.schemas.common_schema import MessageResponseSchema, CacheStatsResponseSchema, HashingStatsResponseSchema, PoolStatsResponseSchema, SlowQueriesResponseSchema
+from backend.schemas.user_schemas import ChangeAdminStatusSchema
+from backend.database.database import session_dep, new_session, engine, read_engines, read_routing, DB_READ_STRATEGY, session_stats
+from backend.database.pool import pool_stats
+from backend.services.catalog_cache import catalog_cache, invalidate_catalog
+from backend.services.search_index import product_search_index
+from backend.services.auth import admin_dep, invalidate_principal
+from backend.services.hashing import hashing_stats
+from backend.services.slow_queries import slow_query_log, SLOW_QUERY_MS
+from backend.services.sql_metrics import streamed_response
+from backend.services.statements import user_by_id
 
 
 router = APIRouter()
 
 
 
-#-----------Category----------#
-@router.post('/category/add_category', tags=['For admin'])
-async def add_category(data: CategoryShema, session: session_dep, token: str = Cookie(...)):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
+# cart_items.product_id has no ON DELETE rule, so drop the cart lines of products about to be deleted
+# in the same transaction; the order ledger keeps its lines and only forgets the product id
+async def release_products(session, *criteria):
+    product_ids = select(ProductModel.id).where(*criteria)
 
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
+    await session.execute(delete(CartItemModel).where(CartItemModel.product_id.in_(product_ids)))
+    await session.execute(update(OrderLineModel).where(OrderLineModel.product_id.in_(product_ids)).values(product_id=None))
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    if not current_user.is_admin:
-        raise HTTPException(status_code=403, detail="You are not an admin")
+#-----------Category----------#
+@router.post('/category/add_category', tags=['For admin'], response_model=AddCategoryResponseSchema)
+async def add_category(data: CategoryShema, session: session_dep, admin_id: admin_dep):
 
     current_category = await session.execute(select(CategoryModel).where(CategoryModel.name == data.name))
     
@@ -44,33 +51,18 @@ async def add_category(data: CategoryShema, session: session_dep, token: str = C
 
     session.add(new_category)
     await session.commit()
+    invalidate_catalog()
 
     return {'success': True, 'message': 'Category was added', 'Category': new_category}
 
 
-@router.put('/category/change_category_name', tags=['For admin'])
-async def change_category_name(category_id: int, data: ChangeCategoryNameSchema, session: session_dep, token: str = Cookie(None)):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
+@router.put('/category/change_category_name', tags=['For admin'], response_model=MessageResponseSchema)
+async def change_category_name(category_id: int, data: ChangeCategoryNameSchema, session: session_dep, admin_id: admin_dep):
 
     category_query = select(CategoryModel).where(CategoryModel.id == category_id)
     category_result = await session.execute(category_query)
     current_category = category_result.scalar_one_or_none()
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if not current_user.is_admin:
-        raise HTTPException(status_code=403, detail="You are not an admin")
-
     if not current_category:
         raise HTTPException(status_code=404, detail='Category not found')
 
@@ -82,70 +74,46 @@ async def change_category_name(category_id: int, data: ChangeCategoryNameSchema,
     current_category.name = data.new_name
 
     await session.commit()
+    invalidate_catalog()
     await session.refresh(current_category)
 
     return {'success': True, 'message': 'Category name was changed'}
 
 
-@router.delete('/category/delete_category', tags=['For admin'])
-async def delete_category(category_id: int, session: session_dep, token: str = Cookie(None)):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
+@router.delete('/category/delete_category', tags=['For admin'], response_model=MessageResponseSchema)
+async def delete_category(category_id: int, session: session_dep, admin_id: admin_dep):
 
     category_query = select(CategoryModel).where(CategoryModel.id == category_id)
     category_result = await session.execute(category_query)
     current_category = category_result.scalar_one_or_none()
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if not current_user.is_admin:
-        raise HTTPException(status_code=403, detail="You are not an admin")
-
     if not current_category:
         raise HTTPException(status_code=404, detail='Category not found')
 
+    await release_products(session, ProductModel.category_id == category_id)
+#   Explicit as well as ON DELETE CASCADE: SQLite doesn't enforce foreign keys by default
+    await session.execute(delete(ProductModel).where(ProductModel.category_id == category_id))
+
     deleted_category = delete(CategoryModel).where(CategoryModel.id == category_id)
 
     await session.execute(deleted_category)
     await session.commit()
+    invalidate_catalog()
+#   The category's products are gone, so rebuild the search index lazily
+    product_search_index.reset()
 
     return {'success': True, 'message': 'Category was deleted'}
 
 
 
 #-----------Products-----------#
-@router.post('/category/product/add_product', tags=['For admin'])
-async def add_product(session: session_dep, category_id: int, name: str = Form(...), price: float = Form(...), image: UploadFile = File(...), token: str = Cookie(None)):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
+@router.post('/category/product/add_product', tags=['For admin'], response_model=AddProductResponseSchema)
+async def add_product(session: session_dep, admin_id: admin_dep, category_id: int, name: str = Form(...), price: float = Form(...), image: UploadFile = File(...)):
 
     category_query = select(CategoryModel).where(CategoryModel.id == category_id)
     category_result = await session.execute(category_query)
     current_category = category_result.scalar_one_or_none()
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if not current_user.is_admin:
-        raise HTTPException(status_code=403, detail="You are not an admin")
-
     if not current_category:
         raise HTTPException(status_code=404, detail='Category not found')
 
@@ -164,33 +132,20 @@ async def add_product(session: session_dep, category_id: int, name: str = Form(.
 
     session.add(new_product)
     await session.commit()
+    invalidate_catalog()
+    if product_search_index.loaded:
+        product_search_index.add(new_product.id, new_product.name)
 
     return {'success': True, 'message': 'Product was added', 'Product': new_product}
 
 
-@router.put('/category/product/change_product_name', tags=['For admin'])
-async def change_product_name(product_id: int, data: ChangeProductNameSchema, session: session_dep, token: str = Cookie(None)):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
+@router.put('/category/product/change_product_name', tags=['For admin'], response_model=MessageResponseSchema)
+async def change_product_name(product_id: int, data: ChangeProductNameSchema, session: session_dep, admin_id: admin_dep):
 
     product_query = select(ProductModel).where(ProductModel.id == product_id)
     product_result = await session.execute(product_query)
     current_product = product_result.scalar_one_or_none()
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if not current_user.is_admin:
-        raise HTTPException(status_code=403, detail="You are not an admin")
-
     if not current_product:
         raise HTTPException(status_code=404, detail='Product not found')
 
@@ -202,68 +157,40 @@ async def change_product_name(product_id: int, data: ChangeProductNameSchema, se
     current_product.name = data.new_name
 
     await session.commit()
+    invalidate_catalog()
+    if product_search_index.loaded:
+        product_search_index.add(current_product.id, current_product.name)
     await session.refresh(current_product)
 
     return {'success': True, 'message': 'Product name was changed'}
 
 
-@router.put('/category/product/change_product_price', tags=['For admin'])
-async def change_product_price(product_id: int, data: ChangeProductPriceSchema, session: session_dep, token: str = Cookie(None)):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
+@router.put('/category/product/change_product_price', tags=['For admin'], response_model=MessageResponseSchema)
+async def change_product_price(product_id: int, data: ChangeProductPriceSchema, session: session_dep, admin_id: admin_dep):
 
     product_query = select(ProductModel).where(ProductModel.id == product_id)
     product_result = await session.execute(product_query)
     current_product = product_result.scalar_one_or_none()
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if not current_user.is_admin:
-        raise HTTPException(status_code=403, detail="You are not an admin")
-
     if not current_product:
         raise HTTPException(status_code=404, detail='Product not found')
 
     current_product.price = data.new_price
 
     await session.commit()
+    invalidate_catalog()
     await session.refresh(current_product)
 
     return {'success': True, 'message': 'Product price was updated'}
 
 
-@router.put('/category/product/change_product_image', tags=['For admin'])
-async def change_product_image(product_id: int, session: session_dep, image: UploadFile = File(...), token: str = Cookie(None)):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
+@router.put('/category/product/change_product_image', tags=['For admin'], response_model=ChangeProductImageResponseSchema)
+async def change_product_image(product_id: int, session: session_dep, admin_id: admin_dep, image: UploadFile = File(...)):
 
     product_query = select(ProductModel).where(ProductModel.id == product_id)
     product_result = await session.execute(product_query)
     current_product = product_result.scalar_one_or_none()
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail='User not found')
-
-    if not current_user.is_admin:
-        raise HTTPException(status_code=403, detail='You are not an admin')
-
     if not current_product:
         raise HTTPException(status_code=404, detail='Product not found')
 
@@ -271,46 +198,150 @@ async def change_product_image(product_id: int, session: session_dep, image: Upl
     with open(file_path, "wb") as f:
         f.write(await image.read())
 
-    if os.path.exists(current_product.image):
-        os.remove(current_product.image)
+    if os.path.exists(current_product.image_path):
+        os.remove(current_product.image_path)
 
-    current_product.image = file_path
+    current_product.image_path = file_path
 
     await session.commit()
+    invalidate_catalog()
     await session.refresh(current_product)
 
     return {'success': True, 'message': 'Image was changed', 'image': file_path}
 
 
-@router.delete('/category/product/delete_product', tags=['For admin'])
-async def delete_product(product_id: int, session: session_dep, token: str = Cookie(None)):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
+@router.delete('/category/product/delete_product', tags=['For admin'], response_model=MessageResponseSchema)
+async def delete_product(product_id: int, session: session_dep, admin_id: admin_dep):
 
     product_query = select(ProductModel).where(ProductModel.id == product_id)
     product_result = await session.execute(product_query)
     current_product = product_result.scalar_one_or_none()
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail='User not found')
-
-    if not current_user.is_admin:
-        raise HTTPException(status_code=403, detail='You are not an admin')
-
     if not current_product:
         raise HTTPException(status_code=404, detail='Product not found')
 
-    deleted_product = select(ProductModel).where(ProductModel.id == product_id)
+    await release_products(session, ProductModel.id == product_id)
+
+    deleted_product = delete(ProductModel).where(ProductModel.id == product_id)
 
     await session.execute(deleted_product)
     await session.commit()
+    invalidate_catalog()
+    product_search_index.remove(product_id)
+
+    return {'success': True, 'message': 'Product was deleted from list'}
+
+
+#-----------Users-----------#
+@router.put('/admin/change_admin_status', tags=['For admin'], response_model=MessageResponseSchema)
+async def change_admin_status(user_id: int, data: ChangeAdminStatusSchema, session: session_dep, admin_id: admin_dep):
+
+    if user_id == admin_id and not data.is_admin:
+        raise HTTPException(status_code=400, detail="You can't revoke your own admin rights")
+
+    result = await session.execute(user_by_id, {'user_id': user_id})
+    user = result.scalar_one_or_none()
+
+    if not user:
+        raise HTTPException(status_code=404, detail='User not found')
+
+    user.is_admin = data.is_admin
+#   Tokens issued before the change still carry the old is_admin claim, so revoke them
+    user.token_version += 1
+
+    await session.commit()
+    invalidate_principal(user_id)
+
+    return {'success': True, 'message': 'Admin status was changed'}
+
+
+#-----------Export-----------#
+EXPORT_CHUNK_ROWS = 1000
+
+
+def export_values(row, header: list) -> list:
+    return [row.created_at.isoformat() if key == 'created_at' else getattr(row, key) for key in header]
+
+
+async def stream_products(export_format: str, include_category: bool):
+    columns = [ProductModel.id, ProductModel.name, ProductModel.price, ProductModel.created_at, ProductModel.image_path, ProductModel.category_id]
+    header = ['id', 'name', 'price', 'created_at', 'image_path', 'category_id']
+
+    if include_category:
+        columns.append(CategoryModel.name.label('category_name'))
+        header.append('category_name')
+
+    query = select(*columns).order_by(ProductModel.id).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+
+    if include_category:
+        query = query.outerjoin(CategoryModel, CategoryModel.id == ProductModel.category_id)
+
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        yield buffer.getvalue()
+
+#   Own session: the request session may already be closed while the body is still streaming
+    async with new_session() as session:
+        result = await session.stream(query)
+
+#       Server-side cursor, one chunk of rows in memory at a time
+        async for rows in result.partitions():
+            if export_format == 'csv':
+                buffer.seek(0)
+                buffer.truncate()
+                for row in rows:
+                    writer.writerow(export_values(row, header))
+                yield buffer.getvalue()
+            else:
+                yield ''.join(
+                    json.dumps(dict(zip(header, export_values(row, header))), ensure_ascii=False) + '\n'
+                    for row in rows
+                )
+
+
+@router.get('/category/product/export', tags=['For admin'], dependencies=[streamed_response()])
+async def export_products(admin_id: admin_dep, export_format: Literal['ndjson', 'csv'] = 'ndjson', include_category: bool = False):
+
+    if export_format == 'csv':
+        media_type = 'text/csv'
+    else:
+        media_type = 'application/x-ndjson'
+
+    return StreamingResponse(
+        stream_products(export_format, include_category),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="products.{export_format}"'}
+    )
+
+
+#-----------Stats-----------#
+@router.get('/admin/catalog_cache_stats', tags=['For admin'], response_model=CacheStatsResponseSchema)
+async def catalog_cache_stats(admin_id: admin_dep):
+
+    return {'success': True, 'stats': catalog_cache.stats()}
+
+
+@router.get('/admin/hashing_stats', tags=['For admin'], response_model=HashingStatsResponseSchema)
+async def get_hashing_stats(admin_id: admin_dep):
+
+    return {'success': True, 'stats': hashing_stats()}
+
+
+@router.get('/admin/pool_stats', tags=['For admin'], response_model=PoolStatsResponseSchema)
+async def get_pool_stats(admin_id: admin_dep):
+
+    return {
+        'success': True,
+        'stats': pool_stats(engine),
+        'replicas': [pool_stats(read_engine) for read_engine in read_engines],
+        'read_routing': {'strategy': DB_READ_STRATEGY, 'primary': read_routing['primary'], 'replica': read_routing['replica']},
+        'sessions': session_stats(),
+    }
+
+
+@router.get('/admin/slow_queries', tags=['For admin'], response_model=SlowQueriesResponseSchema)
+async def get_slow_queries(admin_id: admin_dep):
 
-    return {'success': True, 'message': 'Product was deleted from list'}
\ No newline at end of file
+    return {'success': True, 'threshold_ms': SLOW_QUERY_MS, 'queries': slow_query_log()}
@@ -1,39 +1,36 @@
-from fastapi import APIRouter, HTTPException, Cookie, Response
-from sqlalchemy import select, delete
+from fastapi import APIRouter, HTTPException
+from sqlalchemy import delete, update
 import random
 
-from backend.models.models import CardModel, UserModel
-from backend.schemas.card_schema import CreateCardShema, UpdateBalanceSchema, ChangeCardPasswordSchema, DeleteCardSchema
-from backend.database.database import session_dep
-from backend.database.hash import hashing_password, pwd_context, security, config
+from backend.models.models import CardModel
+from backend.schemas.card_schema import CreateCardShema, UpdateBalanceSchema, ChangeCardPasswordSchema, DeleteCardSchema, CreateCardResponseSchema, AddBalanceResponseSchema, BalanceResponseSchema, CardInfoResponseSchema
+from backend.schemas.common_schema import MessageResponseSchema
+from backend.database.database import session_dep, read_session_dep
+from backend.services.hashing import hash_password, verify_password
+from backend.services.auth import user_id_dep
+from backend.services.idempotency import idempotency_key_dep, run_idempotent
+from backend.services.statements import user_by_id, card_by_user_id, card_id_by_user_id
 
 
 router = APIRouter()
 
 
-@router.post('/card/create_card', tags=['Card'])
-async def create_card(data: CreateCardShema, session: session_dep, token: str = Cookie):
+@router.post('/card/create_card', tags=['Card'], response_model=CreateCardResponseSchema)
+async def create_card(data: CreateCardShema, session: session_dep, user_id: user_id_dep):
 
-    if not token:
-        raise HTTPException(status_code=401, detail="No token")
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
+    result = await session.execute(user_by_id, {'user_id': user_id})
     current_user = result.scalar_one_or_none()
 
     if not current_user:
         raise HTTPException(status_code=404, detail='User not found')
 
-    if not pwd_context.verify(data.user_password, current_user.password):
+    if not await verify_password(data.user_password, current_user.password):
         raise HTTPException(status_code=400, detail='Incorrect password')
 
     if data.card_password != data.repeat_card_password:
         return {'success': False, 'message': "The passwords don't match"}
 
-    exiting_card = await session.execute(select(CardModel).where(CardModel.user_id == user_id))
+    exiting_card = await session.execute(card_id_by_user_id, {'user_id': user_id})
 
     if exiting_card.scalar_one_or_none():
         return {'success': False, 'message': 'You already have a card'}
@@ -41,7 +38,7 @@ async def create_card(data: CreateCardShema, session: session_dep, token: str =
     card = CardModel(
         user_id=user_id,
         card=random.randint(1000000000000000, 9999999999999999),
-        card_password=hashing_password(data.card_password),
+        card_password=await hash_password(data.card_password),
         balance=0
     )
 
@@ -51,50 +48,50 @@ async def create_card(data: CreateCardShema, session: session_dep, token: str =
     return {'success': True, 'message': 'Card was created', 'info': card}
 
 
-@router.put('/card/add_balance', tags=['Card'])
-async def add_balance(data: UpdateBalanceSchema, session: session_dep, token: str = Cookie):
-    
-    if not token: 
-        raise HTTPException(status_code=401, detail="No token")
+@router.put('/card/add_balance', tags=['Card'], response_model=AddBalanceResponseSchema)
+async def add_balance(data: UpdateBalanceSchema, session: session_dep, user_id: user_id_dep, idempotency_key: idempotency_key_dep = None):
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
+    async def update_balance():
+        result = await session.execute(card_by_user_id, {'user_id': user_id})
+        current_card = result.scalar_one_or_none()
 
-    query = select(CardModel).where(CardModel.user_id == user_id)
-    result = await session.execute(query)
-    current_card = result.scalar_one_or_none()
+        if not current_card:
+            raise HTTPException(status_code=404, detail='Card not found')
 
-    if not current_card:
-        raise HTTPException(status_code=404, detail='Card not found')
-    
-    card_password=data.card_password
-    amount=data.amount
+        card_password=data.card_password
+        amount=data.amount
 
-    if amount <= 0:
-        raise HTTPException(status_code=400, detail="Amount must be positive")
+        if amount <= 0:
+            raise HTTPException(status_code=400, detail="Amount must be positive")
 
-    if not pwd_context.verify(card_password, current_card.card_password):
-        raise HTTPException(status_code=400, detail='Incorrect password')
+        if not await verify_password(card_password, current_card.card_password):
+            raise HTTPException(status_code=400, detail='Incorrect password')
 
-    current_card.balance += amount
+#       Credit in the database: a balance read before the bcrypt await may already be stale
+        result = await session.execute(
+            update(CardModel)
+            .where(CardModel.user_id == user_id)
+            .values(balance=CardModel.balance + amount)
+            .returning(CardModel.balance)
+        )
+        balance = result.scalar_one_or_none()
 
-    await session.commit()
-    await session.refresh(current_card)
+        if balance is None:
+            await session.rollback()
+            raise HTTPException(status_code=404, detail='Card not found')
+
+        await session.commit()
 
-    return {'success': True, 'message': 'Balance was updated', 'Your balance': current_card.balance}
+        return {'success': True, 'message': 'Balance was updated', 'Your balance': balance}
 
+#   A retried request with the same key gets the stored answer instead of a second top-up
+    return await run_idempotent(idempotency_key, f'{user_id}:add_balance', {'amount': data.amount}, update_balance)
 
-@router.get('/card/get_balance', tags=['Card'])
-async def get_balance(session: session_dep, token: str = Cookie):
-    
-    if not token:
-        raise HTTPException(status_code=401, detail="No token")
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub) 
+@router.get('/card/get_balance', tags=['Card'], response_model=BalanceResponseSchema)
+async def get_balance(session: read_session_dep, user_id: user_id_dep):
 
-    query = select(CardModel).where(CardModel.user_id == user_id)
-    result = await session.execute(query)
+    result = await session.execute(card_by_user_id, {'user_id': user_id})
     current_card = result.scalar_one_or_none()
 
     if not current_card:
@@ -103,17 +100,10 @@ async def get_balance(session: session_dep, token: str = Cookie):
     return {'success': True, 'balance': current_card.balance}
 
 
-@router.get('/card/get_info', tags=['Card'])
-async def get_info(session: session_dep, token: str = Cookie):
-    
-    if not token:
-        raise HTTPException(status_code=401, detail="No token")
+@router.get('/card/get_info', tags=['Card'], response_model=CardInfoResponseSchema)
+async def get_info(session: read_session_dep, user_id: user_id_dep):
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub) 
-
-    query = select(CardModel).where(CardModel.user_id == user_id)
-    result = await session.execute(query)
+    result = await session.execute(card_by_user_id, {'user_id': user_id})
     current_card = result.scalar_one_or_none()
 
     if not current_card:
@@ -122,29 +112,22 @@ async def get_info(session: session_dep, token: str = Cookie):
     return {'success': True, 'info': current_card}
 
 
-@router.put('/card/change_password', tags=['Card'])
-async def change_card_password(data: ChangeCardPasswordSchema, session: session_dep, token: str = Cookie):
-
-    if not token:
-        raise HTTPException(status_code=401, detail="No token")
+@router.put('/card/change_password', tags=['Card'], response_model=MessageResponseSchema)
+async def change_card_password(data: ChangeCardPasswordSchema, session: session_dep, user_id: user_id_dep):
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(CardModel).where(CardModel.user_id == user_id)
-    result = await session.execute(query)
+    result = await session.execute(card_by_user_id, {'user_id': user_id})
     current_card = result.scalar_one_or_none()
 
     if not current_card:
         raise HTTPException(status_code=404, detail='Card not found')
 
-    if not pwd_context.verify(data.old_card_password, current_card.card_password):
+    if not await verify_password(data.old_card_password, current_card.card_password):
         raise HTTPException(status_code=400, detail='Incorrect password')
 
     if data.new_card_password != data.repeat_new_card_password:
         raise HTTPException(status_code=400, detail="The passwords don't match")
 
-    current_card.card_password = hashing_password(data.new_card_password)
+    current_card.card_password = await hash_password(data.new_card_password)
 
     await session.commit()
     await session.refresh(current_card)
@@ -152,23 +135,16 @@ async def change_card_password(data: ChangeCardPasswordSchema, session: session_
     return {'success': True, 'message': 'Password was changed'}
 
 
-@router.delete('/card/delete_card', tags=['Card'])
-async def delete_card(data: DeleteCardSchema, session: session_dep, token: str = Cookie):
-
-    if not token:
-        raise HTTPException(status_code=401, detail="No token")
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
+@router.delete('/card/delete_card', tags=['Card'], response_model=MessageResponseSchema)
+async def delete_card(data: DeleteCardSchema, session: session_dep, user_id: user_id_dep):
 
-    query = select(CardModel).where(CardModel.user_id == user_id)
-    result = await session.execute(query)
+    result = await session.execute(card_by_user_id, {'user_id': user_id})
     current_card = result.scalar_one_or_none()
 
     if not current_card:
         raise HTTPException(status_code=404, detail='Card not found')
 
-    if not pwd_context.verify(data.card_password, current_card.card_password):
+    if not await verify_password(data.card_password, current_card.card_password):
         raise HTTPException(status_code=400, detail='Incorrect password')
 
     await session.delete(current_card)
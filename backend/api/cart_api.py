@@ -1,123 +1,116 @@
-from fastapi import APIRouter, HTTPException, Cookie
-from sqlalchemy import select, delete
-from sqlalchemy.orm import joinedload
+from fastapi import APIRouter, HTTPException
+from sqlalchemy import select, delete, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from backend.models.models import CartItemModel, CartModel, UserModel, ProductModel
-from backend.schemas.cart_schema import CartItemSchema, DeleteItemSchema, DeleteOneItemSchema
-from backend.database.database import session_dep
-from backend.database.hash import security
+from backend.models.models import CartItemModel, CartModel, ProductModel
+from backend.schemas.cart_schema import CartItemSchema, BulkCartItemsSchema, DeleteItemSchema, DeleteOneItemSchema, CartInfoSchema
+from backend.schemas.common_schema import MessageResponseSchema
+from backend.database.database import session_dep, read_session_dep
+from backend.services.auth import user_id_dep
+from backend.services.sql_metrics import query_budget
+from backend.services.cart import get_cart_view, invalidate_cart_view
+from backend.services.statements import cart_id_by_user_id
 
 
 router = APIRouter()
 
 
-@router.post('/cart/add_product_to_cart', tags=['Cart'])
-async def add_product(data: CartItemSchema, session: session_dep, token: str = Cookie):
+async def upsert_cart_item(session, user_id: int, product_id: int, quantity: int):
+    dialect = session.get_bind().dialect.name
+    dml_insert = pg_insert if dialect == 'postgresql' else sqlite_insert
 
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
+#   Rows only come out of this SELECT when both the user's cart and the product exist; the explicit
+#   JOIN pairs the one cart row with the one product row instead of leaving a cartesian product to the planner
+    insert_stmt = dml_insert(CartItemModel).from_select(
+        ['cart_id', 'product_id', 'quantity'],
+        select(CartModel.id, ProductModel.id, literal(quantity))
+        .select_from(CartModel)
+        .join(ProductModel, ProductModel.id == product_id)
+        .where(CartModel.user_id == user_id)
+    )
+    upsert = insert_stmt.on_conflict_do_update(
+        index_elements=[CartItemModel.cart_id, CartItemModel.product_id],
+        set_={'quantity': CartItemModel.quantity + insert_stmt.excluded.quantity}
+    ).returning(CartItemModel.cart_id)
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
+    result = await session.execute(upsert)
+    return result.scalar_one_or_none()
 
-#   Get current user
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
 
-#   Get current product from catalog to add in the cart
-    product_query = select(ProductModel).where(ProductModel.id == data.product_id)
-    product_result = await session.execute(product_query)
-    current_product = product_result.scalar_one_or_none()
+async def get_own_cart_item(session, user_id: int, cart_item_id: int):
+#   Only lines of the caller's own cart: someone else's cart_item_id is "not in your cart"
+    cart_id = select(CartModel.id).where(CartModel.user_id == user_id).scalar_subquery()
+    result = await session.execute(select(CartItemModel).where(CartItemModel.id == cart_item_id, CartItemModel.cart_id == cart_id))
+    return result.scalar_one_or_none()
 
-#   Get cart for the current user
-    query_cart = select(CartModel).where(CartModel.user_id == user_id)
-    cart_result = await session.execute(query_cart)
-    current_cart = cart_result.scalar_one_or_none()
 
-    if not current_product:
-        raise HTTPException(status_code=404, detail='Product not found')
+@router.post('/cart/add_product_to_cart', tags=['Cart'], response_model=MessageResponseSchema, dependencies=[query_budget(2)])
+async def add_product(data: CartItemSchema, session: session_dep, user_id: user_id_dep):
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail='User not found')
+    cart_id = await upsert_cart_item(session, user_id, data.product_id, data.quantity)
 
-#   We check the availability of the product being added in the cart
-    query_item = select(CartItemModel).where(CartItemModel.product_id == data.product_id, CartItemModel.cart_id == current_cart.id)
-    result_item = await session.execute(query_item)
-    current_item = result_item.scalar_one_or_none()
+    if cart_id is None:
+        await session.rollback()
+        cart_exists = await session.execute(cart_id_by_user_id, {'user_id': user_id})
+        if cart_exists.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail='Cart not found')
+        raise HTTPException(status_code=404, detail='Product not found')
 
-    if current_item:
-        current_item.quantity += data.quantity
-        current_cart.total_price += current_product.price * data.quantity
-        await session.commit()
-        await session.refresh(current_cart)
-    else:
-#   Add new product in the cart
-        new_item = CartItemModel(
-            cart_id=current_cart.id,
-            product_id=data.product_id,
-            quantity=data.quantity
-        )
+    await session.commit()
+    invalidate_cart_view(user_id)
 
-        session.add(new_item)
+    return {'success': True, 'message': 'Product was added'}
 
-        current_cart.total_price += current_product.price * data.quantity
 
-        await session.commit()
-        await session.refresh(current_cart)
+@router.post('/cart/add_products_to_cart', tags=['Cart'], response_model=CartInfoSchema, dependencies=[query_budget(4)])
+async def add_products(data: BulkCartItemsSchema, session: session_dep, user_id: user_id_dep):
 
-    return {'success': True, 'message': 'Product was added'}
+#   The same product may be listed twice, add up its quantities
+    quantities = {}
+    for item in data.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
 
+    products_result = await session.execute(select(ProductModel.id).where(ProductModel.id.in_(quantities)))
+    found = set(products_result.scalars().all())
 
-@router.get('/cart/get_info', tags=['Cart'])
-async def get_info(session: session_dep, token: str = Cookie):
-    
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
+    missing = sorted(set(quantities) - found)
+    if missing:
+        raise HTTPException(status_code=404, detail=f'Products not found: {missing}')
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
+    cart_result = await session.execute(cart_id_by_user_id, {'user_id': user_id})
+    cart_id = cart_result.scalar_one_or_none()
 
-    query_user_cart = select(CartModel).where(CartModel.user_id == user_id)
-    result_user_cart = await session.execute(query_user_cart)
-    current_user_cart = result_user_cart.scalar_one_or_none()
+    if cart_id is None:
+        raise HTTPException(status_code=404, detail='Cart not found')
 
-    query_cart_items = (select(CartItemModel).where(CartItemModel.cart_id == current_user_cart.id).options(joinedload(CartItemModel.product)))
-    result_cart_items = await session.execute(query_cart_items)
-    cart_items = result_cart_items.scalars().all()
+    dml_insert = pg_insert if session.get_bind().dialect.name == 'postgresql' else sqlite_insert
 
-    # Формируем ответ
-    return {
-        'cart_items': [{
-            'product_id': item.product_id,
-            'name': item.product.name,
-            'price': item.product.price,
-            'quantity': item.quantity,
-            'total': item.product.price * item.quantity
-        } for item in cart_items],
-        'total_price': current_user_cart.total_price
-    }
+    insert_stmt = dml_insert(CartItemModel).values([
+        {'cart_id': cart_id, 'product_id': product_id, 'quantity': quantity}
+        for product_id, quantity in quantities.items()
+    ])
+    await session.execute(insert_stmt.on_conflict_do_update(
+        index_elements=[CartItemModel.cart_id, CartItemModel.product_id],
+        set_={'quantity': CartItemModel.quantity + insert_stmt.excluded.quantity}
+    ))
 
+    await session.commit()
+    invalidate_cart_view(user_id)
+
+    return await get_cart_view(session, user_id)
 
-@router.put('/cart/remove_one_item', tags=['Cart'])
-async def remove_one_item(data: DeleteOneItemSchema, session: session_dep, token: str = Cookie):
 
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
+@router.get('/cart/get_info', tags=['Cart'], response_model=CartInfoSchema, dependencies=[query_budget(1)])
+async def get_info(session: read_session_dep, user_id: user_id_dep):
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
+    return await get_cart_view(session, user_id)
 
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail='User not found')
+@router.put('/cart/remove_one_item', tags=['Cart'], response_model=MessageResponseSchema, dependencies=[query_budget(2)])
+async def remove_one_item(data: DeleteOneItemSchema, session: session_dep, user_id: user_id_dep):
 
-    query_item = select(CartItemModel).where(CartItemModel.id == data.cart_item_id)
-    result_item = await session.execute(query_item)
-    current_item = result_item.scalar_one_or_none()
+    current_item = await get_own_cart_item(session, user_id, data.cart_item_id)
 
     if not current_item:
         raise HTTPException(status_code=404, detail='There is no such product in your cart')
@@ -128,85 +121,39 @@ async def remove_one_item(data: DeleteOneItemSchema, session: session_dep, token
         await session.delete(current_item)
 
     await session.commit()
+    invalidate_cart_view(user_id)
 
     return {'success': True, 'message': 'Product quantity decreased'}
 
 
-@router.delete('/cart/delete_product', tags=['Cart'])
-async def delete_item(data: DeleteItemSchema, session: session_dep, token: str = Cookie):
-    
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
-
-    if not current_user:
-        raise HTTPException(status_code=404, detail='User not found')
+@router.delete('/cart/delete_product', tags=['Cart'], response_model=MessageResponseSchema, dependencies=[query_budget(2)])
+async def delete_item(data: DeleteItemSchema, session: session_dep, user_id: user_id_dep):
 
-    query_item = select(CartItemModel).where(CartItemModel.id == data.cart_item_id)
-    result_item = await session.execute(query_item)
-    current_item = result_item.scalar_one_or_none()
+    current_item = await get_own_cart_item(session, user_id, data.cart_item_id)
 
     if not current_item:
         raise HTTPException(status_code=404, detail='There is no such product in your cart')
 
     await session.delete(current_item)
     await session.commit()
-
-    query_current_user_cart = await session.execute(select(CartModel).where(CartModel.user_id == user_id))
-    current_user_cart = query_current_user_cart.scalar_one_or_none()
-
-    query_items = select(CartItemModel).where(CartItemModel.cart_id == current_user_cart.id).options(joinedload(CartItemModel.product))
-    result_items = await session.execute(query_items)
-    remaining_items = result_items.scalars().all()
-
-    total = 0
-    for i in remaining_items:
-        total += i.product.price * i.quantity
-    current_user_cart.total_price = total
-
-    await session.commit()
+    invalidate_cart_view(user_id)
 
     return {'success': True, 'message': 'Product was deleted from your cart'}
 
 
-@router.delete('/cart/delete_all_items', tags=['Cart'])
-async def delete_all_items(session: session_dep, token: str = Cookie):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
+@router.delete('/cart/delete_all_items', tags=['Cart'], response_model=MessageResponseSchema, dependencies=[query_budget(1)])
+async def delete_all_items(session: session_dep, user_id: user_id_dep):
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
+    cart_id = select(CartModel.id).where(CartModel.user_id == user_id).scalar_subquery()
 
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
+#   One set-based DELETE instead of loading every line and deleting it row by row
+    result = await session.execute(delete(CartItemModel).where(CartItemModel.cart_id == cart_id))
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail='User not found')
-
-    query_user_cart = select(CartModel).where(CartModel.user_id == user_id)
-    result_user_cart = await session.execute(query_user_cart)
-    current_user_cart = result_user_cart.scalar_one_or_none()
-
-    query_cart_items = select(CartItemModel).where(CartItemModel.cart_id == current_user_cart.id)
-    result_cart_items = await session.execute(query_cart_items)
-    cart_items = result_cart_items.scalars().all()
-
-    if not cart_items:
+    if not result.rowcount:
+        await session.rollback()
         raise HTTPException(status_code=404, detail='Cart not found')
 
-    for item in cart_items:
-        await session.delete(item)
-
-    current_user_cart.total_price = 0
-
     await session.commit()
+    invalidate_cart_view(user_id)
 
     return {'success': True, 'message': 'All products was deleted'}
\ No newline at end of file
@@ -1,20 +1,190 @@
-from fastapi import APIRouter
-from sqlalchemy import select
+from fastapi import APIRouter, HTTPException, Query, Header, Response
+from sqlalchemy import select, tuple_, func, or_
+from typing import Literal, Optional, List
+from datetime import datetime
+import base64
+import json
 
-from backend.database.database import session_dep
+from backend.database.database import read_session_dep
 from backend.models.models import CategoryModel, ProductModel
+from backend.schemas.category_schema import CategoryInfoSchema
+from backend.schemas.product_schema import ProductPageSchema, ProductSearchPageSchema
+from backend.services.catalog_cache import catalog_cache, cache_catalog, current_catalog_version, catalog_etag, etag_matches
+from backend.services.search_index import product_search_index
 
 
 router = APIRouter()
 
 
-@router.get('/category/get_category', tags=['Catalog'])
-async def get_categories(session: session_dep):
+# Every sort order is (column, direction) and always ends on id so keyset cursors are unique
+SORT_ORDERS = {
+    'newest': (ProductModel.created_at, 'desc'),
+    'oldest': (ProductModel.created_at, 'asc'),
+    'price_asc': (ProductModel.price, 'asc'),
+    'price_desc': (ProductModel.price, 'desc'),
+}
+
+
+def product_to_dict(product: ProductModel) -> dict:
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'created_at': product.created_at,
+        'image_path': product.image_path,
+        'category_id': product.category_id,
+    }
+
+
+def encode_cursor(sort: str, product: ProductModel) -> str:
+    value = product.created_at.isoformat() if sort in ('newest', 'oldest') else product.price
+    raw = json.dumps([sort, value, product.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(sort: str, cursor: str):
+    try:
+        cursor_sort, value, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if cursor_sort != sort:
+            raise ValueError
+        if sort in ('newest', 'oldest'):
+            value = datetime.fromisoformat(value)
+        else:
+            value = float(value)
+        return value, int(product_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+@router.get('/category/get_category', tags=['Catalog'], response_model=List[CategoryInfoSchema])
+async def get_categories(session: read_session_dep, response: Response, if_none_match: Optional[str] = Header(None)):
+    etag = catalog_etag('categories')
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+
+    cached = catalog_cache.get('categories')
+    if cached is not None:
+        return cached
+
+    version = current_catalog_version()
+
     all_categories = await session.execute(select(CategoryModel))
-    return all_categories.scalars().all()
+    categories = [{'id': category.id, 'name': category.name} for category in all_categories.scalars().all()]
+
+    cache_catalog('categories', categories, version)
+    return categories
+
+
+@router.get('/category/product/get_products', tags=['Catalog'], response_model=ProductPageSchema)
+async def get_products(session: read_session_dep,
+                       response: Response,
+                       category_id: Optional[int] = None,
+                       min_price: Optional[float] = Query(None, ge=0),
+                       max_price: Optional[float] = Query(None, ge=0),
+                       sort: Literal['newest', 'oldest', 'price_asc', 'price_desc'] = 'newest',
+                       cursor: Optional[str] = None,
+                       limit: int = Query(24, ge=1, le=100),
+                       if_none_match: Optional[str] = Header(None)):
+
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail='min_price must not be greater than max_price')
+
+    cache_key = ('products', category_id, min_price, max_price, sort, cursor, limit)
+
+#   The catalog version is part of the ETag, so an unchanged catalog is answered without touching the database
+    etag = catalog_etag(*cache_key)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    version = current_catalog_version()
+
+    column, direction = SORT_ORDERS[sort]
+
+    query = select(ProductModel)
+
+    if category_id is not None:
+        query = query.where(ProductModel.category_id == category_id)
+
+    if min_price is not None:
+        query = query.where(ProductModel.price >= min_price)
+
+    if max_price is not None:
+        query = query.where(ProductModel.price <= max_price)
+
+#   Keyset: continue strictly after the last row of the previous page, so every page is one index range scan
+    if cursor:
+        value, last_id = decode_cursor(sort, cursor)
+        if direction == 'desc':
+            query = query.where(tuple_(column, ProductModel.id) < tuple_(value, last_id))
+        else:
+            query = query.where(tuple_(column, ProductModel.id) > tuple_(value, last_id))
+
+    if direction == 'desc':
+        query = query.order_by(column.desc(), ProductModel.id.desc())
+    else:
+        query = query.order_by(column.asc(), ProductModel.id.asc())
+
+#   Fetch one extra row to know whether there is a next page without a COUNT(*)
+    result = await session.execute(query.limit(limit + 1))
+    products = result.scalars().all()
+
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = encode_cursor(sort, products[-1])
+
+    page = {'items': [product_to_dict(product) for product in products], 'next_cursor': next_cursor}
+
+    cache_catalog(cache_key, page, version)
+    return page
+
+
+
+@router.get('/category/product/search', tags=['Catalog'], response_model=ProductSearchPageSchema)
+async def search_products(session: read_session_dep,
+                          q: str = Query(..., min_length=2, max_length=50),
+                          limit: int = Query(20, ge=1, le=50),
+                          offset: int = Query(0, ge=0, le=1000)):
+
+    q = q.strip()
+
+    if session.get_bind().dialect.name == 'postgresql':
+#       Served by the pg_trgm GIN index on products.name: prefix hits first, then by trigram word similarity
+        score = func.word_similarity(q, ProductModel.name)
+        escaped = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+        query = (
+            select(ProductModel, score)
+            .where(or_(ProductModel.name.op('%>')(q), ProductModel.name.ilike(f'%{escaped}%', escape='\\')))
+            .order_by(ProductModel.name.istartswith(q, autoescape=True).desc(), score.desc(), func.similarity(ProductModel.name, q).desc(), ProductModel.id)
+            .limit(limit + 1)
+            .offset(offset)
+        )
+        result = await session.execute(query)
+        rows = result.all()
+        products = [(product, round(float(rank), 4)) for product, rank in rows[:limit]]
+        has_more = len(rows) > limit
+    else:
+        await product_search_index.ensure_loaded(session)
+        hits = product_search_index.search(q, limit=limit + 1, offset=offset)
+        has_more = len(hits) > limit
+        hits = hits[:limit]
 
+        result = await session.execute(select(ProductModel).where(ProductModel.id.in_([product_id for product_id, _ in hits])))
+        by_id = {product.id: product for product in result.scalars().all()}
+        products = [(by_id[product_id], round(rank, 4)) for product_id, rank in hits if product_id in by_id]
 
-@router.get('/category/product/get_products', tags=['Catalog'])
-async def get_products(session: session_dep):
-    all_products = await session.execute(select(ProductModel))
-    return all_products.scalars().all()
\ No newline at end of file
+    return {
+        'items': [{**product_to_dict(product), 'score': rank} for product, rank in products],
+        'next_offset': offset + limit if has_more else None,
+    }
\ No newline at end of file
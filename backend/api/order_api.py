@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Query
+from sqlalchemy import select
+from typing import Optional
+
+from backend.database.database import read_session_dep
+from backend.models.models import OrderModel, OrderLineModel
+from backend.schemas.order_schema import OrderPageSchema
+from backend.services.auth import user_id_dep
+
+
+router = APIRouter()
+
+
+@router.get('/orders/get_history', tags=['Orders'], response_model=OrderPageSchema)
+async def get_history(session: read_session_dep,
+                      user_id: user_id_dep,
+                      cursor: Optional[int] = Query(None, ge=1),
+                      limit: int = Query(20, ge=1, le=100)):
+
+    query = select(OrderModel.id, OrderModel.total, OrderModel.created_at).where(OrderModel.user_id == user_id)
+
+#   Newest first; the cursor is the last order id of the previous page, served by ix_orders_user_id_id
+    if cursor is not None:
+        query = query.where(OrderModel.id < cursor)
+
+    result = await session.execute(query.order_by(OrderModel.id.desc()).limit(limit + 1))
+    orders = result.all()
+
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = orders[-1].id
+
+    lines = {order.id: [] for order in orders}
+
+#   Lines of the whole page in one query instead of one per order
+    if orders:
+        lines_result = await session.execute(
+            select(OrderLineModel.order_id, OrderLineModel.product_id, OrderLineModel.name, OrderLineModel.price, OrderLineModel.quantity)
+            .where(OrderLineModel.order_id.in_(list(lines)))
+            .order_by(OrderLineModel.id)
+        )
+        for line in lines_result.all():
+            lines[line.order_id].append({'product_id': line.product_id, 'name': line.name, 'price': line.price, 'quantity': line.quantity})
+
+    return {
+        'items': [{'id': order.id, 'total': order.total, 'created_at': order.created_at, 'lines': lines[order.id]} for order in orders],
+        'next_cursor': next_cursor,
+    }
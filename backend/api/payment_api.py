@@ -1,98 +1,147 @@
-from fastapi import APIRouter, HTTPException, Cookie
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
-
-from backend.schemas.payment_schema import PayItemSchema
-from backend.models.models import UserModel, CartItemModel, CartModel, CardModel
+from fastapi import APIRouter, HTTPException
+from sqlalchemy import select, insert, delete, update, func, literal
+from typing import Optional
+from datetime import datetime
+
+from backend.schemas.payment_schema import PayItemSchema, PaySelectedItemsSchema
+from backend.schemas.common_schema import MessageResponseSchema
+from backend.models.models import CartItemModel, CartModel, CardModel, ProductModel, OrderModel, OrderLineModel
 from backend.database.database import session_dep
-from backend.database.hash import security
+from backend.services.auth import user_id_dep
+from backend.services.sql_metrics import query_budget
+from backend.services.cart import cart_lines, line_total, invalidate_cart_view
+from backend.services.idempotency import idempotency_key_dep, run_idempotent
+from backend.services.statements import card_id_by_user_id
 
 
 router = APIRouter()
 
 
-@router.put('/payment/pay_for_one_item', tags=['Payment'])
-async def pay_one_item(data: PayItemSchema, session: session_dep, token: str = Cookie):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = await session.execute(select(UserModel).where(UserModel.id == user_id))
-    current_user = query.scalar_one_or_none()
-
-    if not current_user:
-        raise HTTPException(status_code=404, detail='User not found')
-
-    query_current_item = await session.execute(select(CartItemModel).where(CartItemModel.id == data.cart_item_id).options(joinedload(CartItemModel.product)))
-    current_item = query_current_item.scalar_one_or_none()
-
-    if not current_item:
-        raise HTTPException(status_code=404, detail='There is no such product in your cart')
-
-    query_current_card = await session.execute(select(CardModel).where(CardModel.user_id == user_id))
-    current_card = query_current_card.scalar_one_or_none()
-
-    if not current_card:
+# Debits the card, removes the paid lines and records the order in one transaction, or changes nothing.
+# The card is only debited with balance = balance - total WHERE balance >= total while the lines are
+# locked (deleted first on PostgreSQL, under SQLite's write lock elsewhere), so concurrent checkouts can't overdraw it.
+# Lines whose product no longer exists are removed without being charged.
+# With expected_lines set, nothing is paid unless exactly that many lines matched
+async def checkout(session, user_id: int, *criteria, empty_detail: str, expected_lines: Optional[int] = None):
+    cart_id = select(CartModel.id).where(CartModel.user_id == user_id).scalar_subquery()
+    created_at = datetime.utcnow()
+    order_id = amount = None
+
+    if session.get_bind().dialect.name == 'postgresql':
+#       Single round trip: DELETE ... RETURNING feeds the priced lines, the conditional UPDATE debits
+#       their total and the order row is only inserted when the debit went through
+        paid = (
+            delete(CartItemModel)
+            .where(CartItemModel.cart_id == cart_id, *criteria)
+            .returning(CartItemModel.product_id, CartItemModel.quantity)
+            .cte('paid')
+        )
+        priced = (
+            select(paid.c.product_id, ProductModel.name, ProductModel.price, paid.c.quantity)
+            .select_from(paid)
+            .join(ProductModel, ProductModel.id == paid.c.product_id)
+            .cte('priced')
+        )
+        total = (
+            select(func.coalesce(func.sum(line_total(priced.c.price, priced.c.quantity)), 0).label('amount'), func.count().label('lines'))
+            .select_from(priced)
+            .cte('total')
+        )
+        debit = (
+            update(CardModel)
+            .values(balance=CardModel.balance - total.c.amount)
+            .where(CardModel.user_id == user_id, CardModel.balance >= total.c.amount, total.c.lines == expected_lines if expected_lines else total.c.lines > 0)
+            .returning(total.c.amount)
+            .cte('debit')
+        )
+        new_order = (
+            insert(OrderModel)
+            .from_select(['user_id', 'total', 'created_at'], select(literal(user_id), debit.c.amount, literal(created_at)))
+            .returning(OrderModel.id, OrderModel.total)
+            .cte('new_order')
+        )
+        result = await session.execute(select(new_order.c.id, new_order.c.total, priced).select_from(new_order, priced))
+        rows = result.all()
+
+        if rows:
+            order_id, amount = rows[0].id, rows[0].total
+            lines = [(row.product_id, row.name, row.price, row.quantity) for row in rows]
+    else:
+#       No data-modifying CTEs here, so the debit goes first: pricing the lines inside the conditional
+#       UPDATE takes the write lock, and nothing can change them before they are deleted below
+        priced = cart_lines(cart_id, *criteria).subquery()
+        total = select(func.coalesce(func.sum(line_total(priced.c.price, priced.c.quantity)), 0)).scalar_subquery()
+        line_count = select(func.count()).select_from(priced).scalar_subquery()
+
+        result = await session.execute(
+            update(CardModel)
+            .values(balance=CardModel.balance - total)
+            .where(CardModel.user_id == user_id, CardModel.balance >= total, line_count == expected_lines if expected_lines else line_count > 0)
+            .returning(CardModel.balance)
+        )
+
+        if result.scalar_one_or_none() is not None:
+            result = await session.execute(select(priced, func.sum(line_total(priced.c.price, priced.c.quantity)).over().label('amount')))
+            rows = result.all()
+            amount = rows[0].amount
+            lines = [(row.product_id, row.name, row.price, row.quantity) for row in rows]
+
+            await session.execute(delete(CartItemModel).where(CartItemModel.cart_id == cart_id, *criteria))
+
+            result = await session.execute(insert(OrderModel).values(user_id=user_id, total=amount, created_at=created_at).returning(OrderModel.id))
+            order_id = result.scalar_one()
+
+    if order_id is not None:
+#       The ledger is append-only: every line of the order goes in with one multi-row INSERT
+        await session.execute(insert(OrderLineModel).values([
+            {'order_id': order_id, 'product_id': product_id, 'name': name, 'price': price, 'quantity': quantity}
+            for product_id, name, price, quantity in lines
+        ]))
+        await session.commit()
+        invalidate_cart_view(user_id)
+        return amount
+
+#   Nothing was paid: undo the DELETE and work out why
+    await session.rollback()
+
+    card_result = await session.execute(card_id_by_user_id, {'user_id': user_id})
+    if card_result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail='Card not found')
 
-    final_price = current_item.product.price * current_item.quantity
-
-    if current_card.balance < final_price:
-        raise HTTPException(status_code=400, detail='Not enough balance on your card')
+    lines_result = await session.execute(select(func.count()).select_from(cart_lines(cart_id, *criteria).subquery()))
+    found_lines = lines_result.scalar_one()
+    if not found_lines or (expected_lines is not None and found_lines < expected_lines):
+        raise HTTPException(status_code=404, detail=empty_detail)
 
-    current_card.balance -= final_price
+    raise HTTPException(status_code=400, detail='Not enough balance on your card')
 
-    await session.delete(current_item)
-    await session.commit()
 
-    return {'success': True, 'message': f'Paid {final_price} for the product'}
-
-
-@router.put('/payment/pay_for_all_items', tags=['Payment'])
-async def pay_all_items(session: session_dep, token: str = Cookie):
-
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
+@router.put('/payment/pay_for_one_item', tags=['Payment'], response_model=MessageResponseSchema, dependencies=[query_budget(5)])
+async def pay_one_item(data: PayItemSchema, session: session_dep, user_id: user_id_dep):
 
-    query = await session.execute(select(UserModel).where(UserModel.id == user_id))
-    current_user = query.scalar_one_or_none()
+    final_price = await checkout(session, user_id, CartItemModel.id == data.cart_item_id, empty_detail='There is no such product in your cart')
 
-    if not current_user:
-        raise HTTPException(status_code=404, detail='User not found')
-
-    query_current_user_cart = await session.execute(select(CartModel).where(CartModel.user_id == user_id))
-    current_user_cart = query_current_user_cart.scalar_one_or_none()
-
-    query_current_items = await session.execute(select(CartItemModel).where(CartItemModel.cart_id == current_user_cart.id))
-    current_items = query_current_items.scalars().all()
-
-    if not current_items:
-        raise HTTPException(status_code=404, detail='Your cart is empty')
+    return {'success': True, 'message': f'Paid {final_price} for the product'}
 
-    query_current_card = await session.execute(select(CardModel).where(CardModel.user_id == user_id))
-    current_card = query_current_card.scalar_one_or_none()
 
-    if not current_card:
-        raise HTTPException(status_code=404, detail='Card not found')
+@router.put('/payment/pay_for_selected_items', tags=['Payment'], response_model=MessageResponseSchema, dependencies=[query_budget(5)])
+async def pay_selected_items(data: PaySelectedItemsSchema, session: session_dep, user_id: user_id_dep):
 
-    final_price = current_user_cart.total_price
+#   Every id has to be a line of the caller's own cart, otherwise nothing is paid
+    cart_item_ids = set(data.cart_item_ids)
 
-    if current_card.balance < final_price:
-        raise HTTPException(status_code=400, detail='Not enough balance on your card')
+    final_price = await checkout(session, user_id, CartItemModel.id.in_(cart_item_ids), empty_detail='Some of these products are not in your cart', expected_lines=len(cart_item_ids))
 
-    current_card.balance -= final_price
+    return {'success': True, 'message': f'Paid {final_price} for the products'}
 
-    for item in current_items:
-        await session.delete(item)
 
-    current_user_cart.total_price = 0
+# 5 for the checkout plus up to 4 for the idempotency record with IDEMPOTENCY_STORE=database
+@router.put('/payment/pay_for_all_items', tags=['Payment'], response_model=MessageResponseSchema, dependencies=[query_budget(9)])
+async def pay_all_items(session: session_dep, user_id: user_id_dep, idempotency_key: idempotency_key_dep = None):
 
-    await session.commit()
+    async def pay():
+        final_price = await checkout(session, user_id, empty_detail='Your cart is empty')
+        return {'success': True, 'message': f'Paid {final_price} for the product'}
 
-    return {'success': True, 'message': f'Paid {final_price} for the product'}
\ No newline at end of file
+#   A retried request with the same key gets the stored answer instead of a second charge
+    return await run_idempotent(idempotency_key, f'{user_id}:pay_for_all_items', None, pay)
@@ -1,22 +1,27 @@
-from fastapi import APIRouter, HTTPException, Cookie, Response
-from sqlalchemy import select, delete
+from fastapi import APIRouter, HTTPException, Response
+from sqlalchemy import delete
 
 from backend.models.models import UserModel, CartModel
-from backend.schemas.user_schemas import CreateUserSchema, LoginUserSchema, ChangePasswordSchema, ChangeNameSchema, DeleteUserSchema
+from backend.schemas.user_schemas import CreateUserSchema, LoginUserSchema, ChangePasswordSchema, ChangeNameSchema, DeleteUserSchema, SignUpResponseSchema, SignInResponseSchema, UserInfoResponseSchema
+from backend.schemas.common_schema import MessageResponseSchema
 from backend.database.database import session_dep
-from backend.database.hash import hashing_password, pwd_context, security, config
+from backend.database.hash import config
+from backend.services.hashing import hash_password, verify_password
+from backend.services.auth import current_user_dep, user_id_dep, invalidate_principal, create_user_token
+from backend.services.cart import invalidate_cart_view
+from backend.services.statements import user_by_id, user_by_email
 
 
 router = APIRouter()
 
 
-@router.post('/users/sign_up', tags=['Users'])
+@router.post('/users/sign_up', tags=['Users'], response_model=SignUpResponseSchema)
 async def sign_up(data: CreateUserSchema, session: session_dep):
 
     if data.password != data.repeat_password:
         raise HTTPException(status_code=400, detail="Passwords don't match")
 
-    exiting_user = await session.execute(select(UserModel).where(UserModel.email == data.email))
+    exiting_user = await session.execute(user_by_email, {'email': data.email})
 
     if exiting_user.scalar_one_or_none():
         raise HTTPException(status_code=409, detail='This email already exits in database')
@@ -27,7 +32,7 @@ async def sign_up(data: CreateUserSchema, session: session_dep):
     new_user = UserModel(
         email=data.email,
         name=data.name,
-        password=hashing_password(data.password)   
+        password=await hash_password(data.password)   
     )
 
     session.add(new_user)
@@ -43,64 +48,46 @@ async def sign_up(data: CreateUserSchema, session: session_dep):
     return {'success': True, 'message': 'User was added', 'info': new_user}
 
 
-@router.post('/users/sign_in', tags=['Users'])
+@router.post('/users/sign_in', tags=['Users'], response_model=SignInResponseSchema)
 async def sign_in(data: LoginUserSchema, session: session_dep, response: Response):
 
-    query = select(UserModel).where(UserModel.email == data.email)
-    result = await session.execute(query)
+    result = await session.execute(user_by_email, {'email': data.email})
     current_user = result.scalar_one_or_none()
 
     if not current_user:
         raise HTTPException(status_code=404, detail='User not found')
 
-    if not pwd_context.verify(data.password, current_user.password):
+    if not await verify_password(data.password, current_user.password):
         raise HTTPException(status_code=400, detail='Incorrect password')
 
-    token = security.create_access_token(uid=str(current_user.id))
+    token = create_user_token(current_user)
     response.set_cookie(key=config.JWT_ACCESS_COOKIE_NAME, value=token, httponly=True, samesite='Lax', max_age=60*60)
 
     return {'success': True, 'message': 'Login successful', 'token': token}
 
 
-@router.get('/users/get_info', tags=['Users'])
-async def get_info(session: session_dep, token: str = Cookie):
+@router.get('/users/get_info', tags=['Users'], response_model=UserInfoResponseSchema)
+async def get_info(current_user: current_user_dep):
+
+    return {'success': True, 'info': {'id': current_user.id, 'email': current_user.email, 'name': current_user.name}}
 
-    if not token:
-        raise HTTPException(status_code=401, detail='No token')
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
+@router.put('/users/change_password', tags=['Users'], response_model=MessageResponseSchema)
+async def change_password(data: ChangePasswordSchema, session: session_dep, current_user_id: user_id_dep):
 
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
+    result = await session.execute(user_by_id, {'user_id': current_user_id})
     current_user = result.scalar_one_or_none()
 
     if not current_user:
         raise HTTPException(status_code=404, detail='User not found')
 
-    return {'success': True, 'info': {'id': current_user.id, 'email': current_user.email, 'name': current_user.name}}
-
-
-@router.put('/users/change_password', tags=['Users'])
-async def change_password(data: ChangePasswordSchema, session: session_dep, token: str = Cookie):
-    
-    if not token:
-        raise HTTPException(status_code=401, detail="No token")
-
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
-    current_user = result.scalar_one_or_none()
-
-    if not pwd_context.verify(data.old_password, current_user.password):
+    if not await verify_password(data.old_password, current_user.password):
         raise HTTPException(status_code=400, detail='Incorrect password')
 
     if data.new_password != data.repeat_new_password:
         raise HTTPException(status_code=400, detail="The passwords don't match")
 
-    current_user.password = hashing_password(data.new_password)
+    current_user.password = await hash_password(data.new_password)
 
     await session.commit()
     await session.refresh(current_user)
@@ -108,47 +95,42 @@ async def change_password(data: ChangePasswordSchema, session: session_dep, toke
     return {'success': True, 'message': 'Password was changed'}
 
 
-@router.put('/users/change_name', tags=['Users'])
-async def change_name(data: ChangeNameSchema, session: session_dep, token: str = Cookie):
-
-    if not token:
-        raise HTTPException(status_code=401, detail="No token")
+@router.put('/users/change_name', tags=['Users'], response_model=MessageResponseSchema)
+async def change_name(data: ChangeNameSchema, session: session_dep, current_user_id: user_id_dep):
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
+    result = await session.execute(user_by_id, {'user_id': current_user_id})
     current_user = result.scalar_one_or_none()
 
-    if not pwd_context.verify(data.password, current_user.password):
+    if not current_user:
+        raise HTTPException(status_code=404, detail='User not found')
+
+    if not await verify_password(data.password, current_user.password):
         raise HTTPException(status_code=400, detail='Incorrect password')
 
     current_user.name = data.new_name
 
     await session.commit()
+    invalidate_principal(current_user_id)
     await session.refresh(current_user)
 
     return {'success': True, 'message': 'Name was changed'}
 
 
-@router.delete('/users/delete_user', tags=['Users'])
-async def delete_user(data: DeleteUserSchema, session: session_dep, token: str = Cookie):
-
-    if not token:
-        raise HTTPException(status_code=401, detail="No token")
+@router.delete('/users/delete_user', tags=['Users'], response_model=MessageResponseSchema)
+async def delete_user(data: DeleteUserSchema, session: session_dep, current_user_id: user_id_dep):
 
-    payload = security._decode_token(token)
-    user_id = int(payload.sub)
-
-    query = select(UserModel).where(UserModel.id == user_id)
-    result = await session.execute(query)
+    result = await session.execute(user_by_id, {'user_id': current_user_id})
     current_user = result.scalar_one_or_none()
 
-    if not pwd_context.verify(data.password, current_user.password):
+    if not current_user:
+        raise HTTPException(status_code=404, detail='User not found')
+
+    if not await verify_password(data.password, current_user.password):
         raise HTTPException(status_code=400, detail='Incorrect password')
 
     await session.delete(current_user)
     await session.commit()
+    invalidate_principal(current_user_id)
+    invalidate_cart_view(current_user_id)
 
     return {'success': True, 'message': 'User was deleted'}
\ No newline at end of file
@@ -1,11 +1,16 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.engine import make_url
 from envparse import Env
 from dotenv import load_dotenv
-from fastapi import Depends
+from fastapi import Depends, Request
 from typing import Annotated
-from sqlalchemy.orm import DeclarativeBase
+import itertools
+import time
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy import event
 
 from backend.database.hash import config
+from backend.database.pool import TimedQueuePool
 
 
 env = Env()
@@ -15,7 +20,32 @@ load_dotenv()
 
 DATABASE_URL = env.str('DATABASE_URL')
 
-engine = create_async_engine(DATABASE_URL, future=True, echo=False)
+DB_POOL_SIZE = env.int('DB_POOL_SIZE', default=5)
+DB_MAX_OVERFLOW = env.int('DB_MAX_OVERFLOW', default=10)
+DB_POOL_TIMEOUT = env.float('DB_POOL_TIMEOUT', default=30.0)
+DB_POOL_RECYCLE = env.int('DB_POOL_RECYCLE', default=1800)
+DB_POOL_PRE_PING = env.bool('DB_POOL_PRE_PING', default=True)
+DB_STATEMENT_TIMEOUT_MS = env.int('DB_STATEMENT_TIMEOUT_MS', default=0)
+
+
+def make_engine(database_url: str):
+    url = make_url(database_url)
+    options = {'future': True, 'echo': False, 'pool_pre_ping': DB_POOL_PRE_PING, 'pool_recycle': DB_POOL_RECYCLE}
+
+#   In-memory SQLite has to stay on its single shared connection
+    if url.database not in (None, '', ':memory:'):
+        options.update(poolclass=TimedQueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+
+    if url.get_backend_name() == 'postgresql' and DB_STATEMENT_TIMEOUT_MS:
+        if url.get_driver_name() == 'asyncpg':
+            options['connect_args'] = {'server_settings': {'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options['connect_args'] = {'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'}
+
+    return create_async_engine(url, **options)
+
+
+engine = make_engine(DATABASE_URL)
 
 
 new_session = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)
@@ -23,11 +53,82 @@ new_session = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=e
 SECRET_KEY = env.str("SECRET_KEY")
 config.JWT_SECRET_KEY = SECRET_KEY
 
+# An AsyncSession only checks out a connection on its first statement, so requests rejected
+# before touching the database (no token, bad JWT, validation errors) never occupy the pool.
+# These counters show how many request sessions actually needed one
+session_metrics = {'opened': 0, 'connected': 0}
+
+
+@event.listens_for(Session, 'after_begin')
+def mark_connected(session, transaction, connection):
+    session.info['connected'] = True
+
+
+def count_session(session: AsyncSession):
+    session_metrics['opened'] += 1
+    if session.info.get('connected'):
+        session_metrics['connected'] += 1
+
+
+def session_stats() -> dict:
+    return {
+        'opened': session_metrics['opened'],
+        'connected': session_metrics['connected'],
+        'without_connection': session_metrics['opened'] - session_metrics['connected'],
+    }
+
+
 async def get_session():
     async with new_session() as session:
-        yield session
+        try:
+            yield session
+        finally:
+            count_session(session)
 
 session_dep = Annotated[AsyncSession, Depends(get_session)]
 
+
+# Optional read replicas, e.g. DATABASE_READ_URLS=postgresql+asyncpg://replica1/shopdb,postgresql+asyncpg://replica2/shopdb
+DATABASE_READ_URLS = [url.strip() for url in env.str('DATABASE_READ_URLS', default='').split(',') if url.strip()]
+DB_READ_STRATEGY = env.str('DB_READ_STRATEGY', default='round_robin')
+DB_READ_STICKY_SECONDS = env.int('DB_READ_STICKY_SECONDS', default=5)
+READ_PRIMARY_COOKIE = 'read_primary'
+
+read_engines = [make_engine(url) for url in DATABASE_READ_URLS]
+read_sessions = [async_sessionmaker(autoflush=False, expire_on_commit=False, bind=read_engine) for read_engine in read_engines]
+read_counter = itertools.count()
+read_routing = {'primary_until': 0.0, 'primary': 0, 'replica': 0}
+
+
+def pin_reads_to_primary(seconds: float = DB_READ_STICKY_SECONDS):
+    read_routing['primary_until'] = max(read_routing['primary_until'], time.monotonic() + seconds)
+
+
+def pick_read_session(request: Request):
+#   Read-your-writes: a client that just changed something (cookie set by the middleware in main.py)
+#   and everybody right after a catalog change reads from the primary until the replicas caught up
+    if not read_sessions or request.cookies.get(READ_PRIMARY_COOKIE) or time.monotonic() < read_routing['primary_until']:
+        read_routing['primary'] += 1
+        return new_session
+
+    read_routing['replica'] += 1
+
+    if DB_READ_STRATEGY == 'least_connections':
+        index = min(range(len(read_engines)), key=lambda i: getattr(read_engines[i].pool, 'checkedout', lambda: 0)())
+    else:
+        index = next(read_counter) % len(read_sessions)
+
+    return read_sessions[index]
+
+
+async def get_read_session(request: Request):
+    async with pick_read_session(request)() as session:
+        try:
+            yield session
+        finally:
+            count_session(session)
+
+read_session_dep = Annotated[AsyncSession, Depends(get_read_session)]
+
 class Base(DeclarativeBase):
     pass
\ No newline at end of file
@@ -0,0 +1,75 @@
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+import time
+
+
+def record_hold_time(dbapi_connection, connection_record):
+    checked_out_at = connection_record.info.pop('checked_out_at', None)
+    metrics = connection_record.info.get('pool_metrics')
+
+    if checked_out_at is not None and metrics is not None:
+        metrics['releases'] += 1
+        metrics['total_hold_ms'] += (time.perf_counter() - checked_out_at) * 1000
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """The default async queue pool, plus counters for how long checkouts wait and connections are held."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'max_checked_out': 0,
+            'releases': 0,
+            'total_hold_ms': 0.0,
+        }
+        event.listen(self, 'checkin', record_hold_time)
+
+    def connect(self):
+        started_at = time.perf_counter()
+
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.metrics['timeouts'] += 1
+            raise
+        finally:
+            wait_ms = (time.perf_counter() - started_at) * 1000
+            self.metrics['total_wait_ms'] += wait_ms
+            self.metrics['max_wait_ms'] = max(self.metrics['max_wait_ms'], wait_ms)
+
+        self.metrics['checkouts'] += 1
+        self.metrics['max_checked_out'] = max(self.metrics['max_checked_out'], self.checkedout())
+        connection.info['checked_out_at'] = time.perf_counter()
+        connection.info['pool_metrics'] = self.metrics
+        return connection
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+
+#   In-memory SQLite keeps its single connection in a StaticPool that has nothing to report
+    if not isinstance(pool, TimedQueuePool):
+        return {'pool': type(pool).__name__}
+
+    checkouts = pool.metrics['checkouts']
+    releases = pool.metrics['releases']
+    return {
+        'pool': type(pool).__name__,
+        'size': pool.size(),
+        'max_overflow': pool._max_overflow,
+        'timeout': pool.timeout(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': pool.overflow(),
+        'checkouts': checkouts,
+        'timeouts': pool.metrics['timeouts'],
+        'avg_wait_ms': round(pool.metrics['total_wait_ms'] / checkouts, 3) if checkouts else 0.0,
+        'max_wait_ms': round(pool.metrics['max_wait_ms'], 3),
+        'max_checked_out': pool.metrics['max_checked_out'],
+        'avg_hold_ms': round(pool.metrics['total_hold_ms'] / releases, 3) if releases else 0.0,
+    }
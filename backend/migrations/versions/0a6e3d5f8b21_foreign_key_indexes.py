@@ -0,0 +1,36 @@
+"""foreign key indexes
+
+Revision ID: 0a6e3d5f8b21
+Revises: f2b8d6c4a913
+Create Date: 2026-10-18 17:35:12.447093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6e3d5f8b21'
+down_revision: Union[str, Sequence[str], None] = 'f2b8d6c4a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Every cart, payment and cart view lookup starts from cart.user_id
+    op.create_index('ix_cart_user_id', 'cart', ['user_id'], unique=False)
+    # cart_items.cart_id is the leading column of uq_cart_items_cart_id_product_id and
+    # products.category_id leads the (category_id, created_at, id) keyset indexes, so only
+    # the referencing product_id columns are left: deleting a product has to find them
+    op.create_index('ix_cart_items_product_id', 'cart_items', ['product_id'], unique=False)
+    op.create_index('ix_order_lines_product_id', 'order_lines', ['product_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_lines_product_id', table_name='order_lines')
+    op.drop_index('ix_cart_items_product_id', table_name='cart_items')
+    op.drop_index('ix_cart_user_id', table_name='cart')
@@ -0,0 +1,32 @@
+"""card balance float
+
+Revision ID: 6b1f0c7d2e94
+Revises: 0a6e3d5f8b21
+Create Date: 2026-10-18 19:42:08.315276
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b1f0c7d2e94'
+down_revision: Union[str, Sequence[str], None] = '0a6e3d5f8b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Prices and order totals are float, so an INTEGER balance silently rounded every debit
+    # while orders.total kept the exact amount
+    with op.batch_alter_table('card') as batch_op:
+        batch_op.alter_column('balance', existing_type=sa.Integer(), type_=sa.Float(), existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('card') as batch_op:
+        batch_op.alter_column('balance', existing_type=sa.Float(), type_=sa.Integer(), existing_nullable=False, postgresql_using='round(balance)::integer')
@@ -0,0 +1,28 @@
+"""user token version
+
+Revision ID: b51e3a7f9c24
+Revises: 7d2e9b4c1f60
+Create Date: 2026-10-18 13:41:05.226891
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b51e3a7f9c24'
+down_revision: Union[str, Sequence[str], None] = '7d2e9b4c1f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
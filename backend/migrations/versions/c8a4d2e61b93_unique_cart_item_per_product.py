@@ -0,0 +1,41 @@
+"""unique cart item per product
+
+Revision ID: c8a4d2e61b93
+Revises: b51e3a7f9c24
+Create Date: 2026-10-18 14:22:48.530177
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8a4d2e61b93'
+down_revision: Union[str, Sequence[str], None] = 'b51e3a7f9c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Merge duplicates left by the old read-then-insert path into the oldest row of each pair
+    op.execute(
+        'UPDATE cart_items SET quantity = ('
+        ' SELECT SUM(c2.quantity) FROM cart_items c2'
+        ' WHERE c2.cart_id = cart_items.cart_id AND c2.product_id = cart_items.product_id'
+        ') WHERE id IN ('
+        ' SELECT MIN(id) FROM cart_items GROUP BY cart_id, product_id HAVING COUNT(*) > 1'
+        ')'
+    )
+    op.execute('DELETE FROM cart_items WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY cart_id, product_id)')
+
+    with op.batch_alter_table('cart_items') as batch_op:
+        batch_op.create_unique_constraint('uq_cart_items_cart_id_product_id', ['cart_id', 'product_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('cart_items') as batch_op:
+        batch_op.drop_constraint('uq_cart_items_cart_id_product_id', type_='unique')
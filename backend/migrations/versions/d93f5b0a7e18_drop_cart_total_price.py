@@ -0,0 +1,39 @@
+"""drop cart total price
+
+Revision ID: d93f5b0a7e18
+Revises: c8a4d2e61b93
+Create Date: 2026-10-18 15:07:19.664203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd93f5b0a7e18'
+down_revision: Union[str, Sequence[str], None] = 'c8a4d2e61b93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Cart totals are computed with SUM(price * quantity), see backend/services/cart.py
+    with op.batch_alter_table('cart') as batch_op:
+        batch_op.drop_column('total_price')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('cart') as batch_op:
+        batch_op.add_column(sa.Column('total_price', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        'UPDATE cart SET total_price = COALESCE(('
+        ' SELECT SUM(products.price * cart_items.quantity) FROM cart_items'
+        ' JOIN products ON products.id = cart_items.product_id'
+        ' WHERE cart_items.cart_id = cart.id'
+        '), 0)'
+    )
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, BigInteger
+from sqlalchemy import ForeignKey, BigInteger, Index, UniqueConstraint
 from pydantic import EmailStr
+from typing import Optional
 from datetime import datetime
 
 from backend.database.database import Base
@@ -11,6 +12,7 @@ class UserModel(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     is_admin: Mapped[bool] = mapped_column(default=False)
+    token_version: Mapped[int] = mapped_column(default=0, server_default='0')
     email: Mapped[str] = mapped_column(unique=True)
     password: Mapped[str] = mapped_column()
     name: Mapped[str] = mapped_column()
@@ -26,7 +28,7 @@ class CardModel(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), unique=True)
     card: Mapped[int] = mapped_column(BigInteger, unique=True)
     card_password: Mapped[str] = mapped_column()
-    balance: Mapped[int] = mapped_column()
+    balance: Mapped[float] = mapped_column()
 
     user = relationship('UserModel', back_populates='card')
 
@@ -52,17 +54,27 @@ class ProductModel(Base):
 
     category = relationship('CategoryModel', back_populates='products')
 
+    __table_args__ = (
+        Index('ix_products_created_at_id', 'created_at', 'id'),
+        Index('ix_products_price_id', 'price', 'id'),
+        Index('ix_products_category_id_created_at_id', 'category_id', 'created_at', 'id'),
+        Index('ix_products_category_id_price_id', 'category_id', 'price', 'id'),
+    )
+
 
 class CartModel(Base):
     __tablename__ = 'cart'
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
-    total_price: Mapped[int] = mapped_column(default=0)
 
     user = relationship('UserModel', back_populates='cart')
     items = relationship('CartItemModel', back_populates='cart')
 
+    __table_args__ = (
+        Index('ix_cart_user_id', 'user_id'),
+    )
+
 
 class CartItemModel(Base):
     __tablename__ = 'cart_items'
@@ -73,4 +85,54 @@ class CartItemModel(Base):
     quantity: Mapped[int] = mapped_column(default=1)
 
     cart = relationship('CartModel', back_populates='items')
-    product = relationship('ProductModel')
\ No newline at end of file
+    product = relationship('ProductModel')
+
+    __table_args__ = (
+        UniqueConstraint('cart_id', 'product_id', name='uq_cart_items_cart_id_product_id'),
+        Index('ix_cart_items_product_id', 'product_id'),
+    )
+
+class OrderModel(Base):
+    __tablename__ = 'orders'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'))
+    total: Mapped[float] = mapped_column(nullable=False)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+
+    lines = relationship('OrderLineModel', back_populates='order')
+
+    __table_args__ = (
+        Index('ix_orders_user_id_id', 'user_id', 'id'),
+    )
+
+
+class OrderLineModel(Base):
+    __tablename__ = 'order_lines'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey('orders.id', ondelete='CASCADE'))
+    product_id: Mapped[Optional[int]] = mapped_column(ForeignKey('products.id', ondelete='SET NULL'))
+    name: Mapped[str] = mapped_column(nullable=False)
+    price: Mapped[float] = mapped_column(nullable=False)
+    quantity: Mapped[int] = mapped_column(nullable=False)
+
+    order = relationship('OrderModel', back_populates='lines')
+
+    __table_args__ = (
+        Index('ix_order_lines_order_id', 'order_id'),
+        Index('ix_order_lines_product_id', 'product_id'),
+    )
+
+
+class IdempotencyKeyModel(Base):
+    __tablename__ = 'idempotency_keys'
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(nullable=False)
+    response: Mapped[Optional[str]] = mapped_column()
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_idempotency_keys_created_at', 'created_at'),
+    )
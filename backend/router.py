@@ -6,6 +6,7 @@ from backend.api.api_for_admin import router as admin_router
 from backend.api.catalog_api import router as catalog_router
 from backend.api.cart_api import router as cart_router
 from backend.api.payment_api import router as payment_router
+from backend.api.order_api import router as order_router
 
 main_router = APIRouter()
 
@@ -14,4 +15,5 @@ main_router.include_router(card_router)
 main_router.include_router(admin_router)
 main_router.include_router(catalog_router)
 main_router.include_router(cart_router)
-main_router.include_router(payment_router)
\ No newline at end of file
+main_router.include_router(payment_router)
+main_router.include_router(order_router)
\ No newline at end of file
@@ -1,4 +1,5 @@
-from pydantic import Field, BaseModel
+from pydantic import Field, BaseModel, ConfigDict
+from typing import Optional
 
 
 class CreateCardShema(BaseModel):
@@ -17,3 +18,28 @@ class ChangeCardPasswordSchema(BaseModel):
 
 class DeleteCardSchema(BaseModel):
     card_password: str = Field(min_length=8, max_length=25, pattern=r'^[a-zA-Z0-9@#$%^&+=]+$')
+
+class CardInfoSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    card: int
+    balance: float
+
+class CreateCardResponseSchema(BaseModel):
+    success: bool
+    message: str
+    info: Optional[CardInfoSchema] = None
+
+class AddBalanceResponseSchema(BaseModel):
+    success: bool
+    message: str
+    balance: float = Field(alias='Your balance')
+
+class BalanceResponseSchema(BaseModel):
+    success: bool
+    balance: float
+
+class CardInfoResponseSchema(BaseModel):
+    success: bool
+    info: CardInfoSchema
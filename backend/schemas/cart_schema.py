@@ -1,12 +1,28 @@
 from pydantic import BaseModel, Field
+from typing import List
 
 class CartItemSchema(BaseModel):
     product_id: int
     quantity: int = Field(ge=1, le=100)
 
+class BulkCartItemsSchema(BaseModel):
+    items: List[CartItemSchema] = Field(min_length=1, max_length=100)
+
 class DeleteItemSchema(BaseModel):
     cart_item_id: int
 
 class DeleteOneItemSchema(BaseModel):
     cart_item_id: int
-    amount: int
\ No newline at end of file
+    amount: int
+
+class CartItemInfoSchema(BaseModel):
+    cart_item_id: int
+    product_id: int
+    name: str
+    price: float
+    quantity: int
+    total: float
+
+class CartInfoSchema(BaseModel):
+    cart_items: List[CartItemInfoSchema]
+    total_price: float
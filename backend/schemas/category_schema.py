@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional
 from fastapi import UploadFile
 
@@ -7,4 +7,15 @@ class CategoryShema(BaseModel):
     name: str = Field(min_length=3, max_length=25, pattern=r'^[a-zA-Zа-яА-Я\s]+$')
 
 class ChangeCategoryNameSchema(BaseModel):
-    new_name: str = Field(min_length=3, max_length=25, pattern=r'^[a-zA-Zа-яА-Я\s]+$')
\ No newline at end of file
+    new_name: str = Field(min_length=3, max_length=25, pattern=r'^[a-zA-Zа-яА-Я\s]+$')
+
+class CategoryInfoSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+
+class AddCategoryResponseSchema(BaseModel):
+    success: bool
+    message: str
+    category: CategoryInfoSchema = Field(alias='Category')
@@ -0,0 +1,81 @@
+from pydantic import BaseModel
+from typing import Optional, List, Any
+from datetime import datetime
+
+
+class MessageResponseSchema(BaseModel):
+    success: bool
+    message: str
+
+class CacheStatsSchema(BaseModel):
+    size: int
+    maxsize: int
+    ttl: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+
+class CacheStatsResponseSchema(BaseModel):
+    success: bool
+    stats: CacheStatsSchema
+
+class HashingStatsSchema(BaseModel):
+    workers: int
+    max_concurrency: int
+    waiting: int
+    running: int
+    max_waiting: int
+    completed: int
+    avg_wait_ms: float
+    avg_run_ms: float
+
+class HashingStatsResponseSchema(BaseModel):
+    success: bool
+    stats: HashingStatsSchema
+
+class PoolStatsSchema(BaseModel):
+    pool: str
+    size: Optional[int] = None
+    max_overflow: Optional[int] = None
+    timeout: Optional[float] = None
+    checked_out: Optional[int] = None
+    checked_in: Optional[int] = None
+    overflow: Optional[int] = None
+    checkouts: Optional[int] = None
+    timeouts: Optional[int] = None
+    avg_wait_ms: Optional[float] = None
+    max_wait_ms: Optional[float] = None
+    max_checked_out: Optional[int] = None
+    avg_hold_ms: Optional[float] = None
+
+class ReadRoutingSchema(BaseModel):
+    strategy: str
+    primary: int
+    replica: int
+
+class SessionStatsSchema(BaseModel):
+    opened: int
+    connected: int
+    without_connection: int
+
+class PoolStatsResponseSchema(BaseModel):
+    success: bool
+    stats: PoolStatsSchema
+    replicas: List[PoolStatsSchema] = []
+    read_routing: Optional[ReadRoutingSchema] = None
+    sessions: Optional[SessionStatsSchema] = None
+
+class SlowQuerySchema(BaseModel):
+    at: datetime
+    route: Optional[str] = None
+    duration_ms: float
+    statement: str
+    parameters: Any = None
+    plan: List[str]
+
+class SlowQueriesResponseSchema(BaseModel):
+    success: bool
+    threshold_ms: float
+    queries: List[SlowQuerySchema]
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+
+class OrderLineInfoSchema(BaseModel):
+    product_id: Optional[int] = None
+    name: str
+    price: float
+    quantity: int
+
+class OrderInfoSchema(BaseModel):
+    id: int
+    total: float
+    created_at: datetime
+    lines: List[OrderLineInfoSchema]
+
+class OrderPageSchema(BaseModel):
+    items: List[OrderInfoSchema]
+    next_cursor: Optional[int] = None
@@ -1,4 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List
 
 class PayItemSchema(BaseModel):
-    cart_item_id: int
\ No newline at end of file
+    cart_item_id: int
+
+class PaySelectedItemsSchema(BaseModel):
+    cart_item_ids: List[int] = Field(min_length=1, max_length=100)
@@ -1,4 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ConfigDict
+from typing import List, Optional
+from datetime import datetime
 
 
 class ProductSchema(BaseModel):
@@ -9,4 +11,35 @@ class ChangeProductNameSchema(BaseModel):
     new_name: str = Field(min_length=3, max_length=25, pattern=r'^[a-zA-Zа-яА-Я\s]+$')
 
 class ChangeProductPriceSchema(BaseModel):
-    new_price: float = Field(ge=1)
\ No newline at end of file
+    new_price: float = Field(ge=1)
+
+class ProductInfoSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    price: float
+    created_at: datetime
+    image_path: str
+    category_id: int
+
+class ProductPageSchema(BaseModel):
+    items: List[ProductInfoSchema]
+    next_cursor: Optional[str] = None
+
+class ProductSearchItemSchema(ProductInfoSchema):
+    score: float
+
+class ProductSearchPageSchema(BaseModel):
+    items: List[ProductSearchItemSchema]
+    next_offset: Optional[int] = None
+
+class AddProductResponseSchema(BaseModel):
+    success: bool
+    message: str
+    product: ProductInfoSchema = Field(alias='Product')
+
+class ChangeProductImageResponseSchema(BaseModel):
+    success: bool
+    message: str
+    image: str
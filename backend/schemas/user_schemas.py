@@ -1,4 +1,4 @@
-from pydantic import EmailStr, Field, BaseModel
+from pydantic import EmailStr, Field, BaseModel, ConfigDict
 
 
 class CreateUserSchema(BaseModel):
@@ -21,4 +21,36 @@ class ChangeNameSchema(BaseModel):
     password: str = Field(min_length=8, max_length=25, pattern=r'^[a-zA-Z0-9@#$%^&+=]+$')
 
 class DeleteUserSchema(BaseModel):
-    password: str = Field(min_length=8, max_length=25, pattern=r'^[a-zA-Z0-9@#$%^&+=]+$')
\ No newline at end of file
+    password: str = Field(min_length=8, max_length=25, pattern=r'^[a-zA-Z0-9@#$%^&+=]+$')
+
+class UserInfoSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    email: str
+    name: str
+
+class SignUpResponseSchema(BaseModel):
+    success: bool
+    message: str
+    info: UserInfoSchema
+
+class SignInResponseSchema(BaseModel):
+    success: bool
+    message: str
+    token: str
+
+class UserInfoResponseSchema(BaseModel):
+    success: bool
+    info: UserInfoSchema
+
+class CurrentUserSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    email: str
+    name: str
+    is_admin: bool
+
+class ChangeAdminStatusSchema(BaseModel):
+    is_admin: bool
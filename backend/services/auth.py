@@ -0,0 +1,99 @@
+from fastapi import Depends, HTTPException, Request
+from authx.exceptions import JWTDecodeError
+from authx.schema import TokenPayload
+from typing import Annotated
+
+from backend.database.database import env, session_dep
+from backend.database.hash import security, config
+from backend.models.models import UserModel
+from backend.schemas.user_schemas import CurrentUserSchema
+from backend.services.cache import TTLCache
+from backend.services.statements import user_by_id, user_token_version
+
+
+# user_id -> CurrentUserSchema. Invalidated by change_name, delete_user and admin status changes
+principal_cache = TTLCache(
+    maxsize=env.int('PRINCIPAL_CACHE_SIZE', default=10000),
+    ttl=env.float('PRINCIPAL_CACHE_TTL', default=30.0),
+)
+
+# user_id -> UserModel.token_version. Admin tokens carry the version they were issued with,
+# bumping it in the database (and here) revokes every older token of that user
+token_version_cache = TTLCache(
+    maxsize=env.int('TOKEN_VERSION_CACHE_SIZE', default=10000),
+    ttl=env.float('TOKEN_VERSION_CACHE_TTL', default=60.0),
+)
+
+
+def invalidate_principal(user_id: int):
+    principal_cache.pop(user_id)
+    token_version_cache.pop(user_id)
+
+
+def create_user_token(user: UserModel) -> str:
+    return security.create_access_token(uid=str(user.id), data={'is_admin': user.is_admin, 'ver': user.token_version})
+
+
+def get_token_payload(request: Request) -> TokenPayload:
+#   Cookie only: a token in the URL would end up in access logs, proxies and browser history
+    token = request.cookies.get(config.JWT_ACCESS_COOKIE_NAME)
+
+    if not token:
+        raise HTTPException(status_code=401, detail='No token')
+
+    try:
+        payload = security._decode_token(token)
+        int(payload.sub)
+    except (JWTDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=401, detail='Invalid token')
+
+    return payload
+
+
+def get_user_id(payload: TokenPayload = Depends(get_token_payload)) -> int:
+    return int(payload.sub)
+
+
+async def get_current_user(session: session_dep, user_id: int = Depends(get_user_id)) -> CurrentUserSchema:
+    current_user = principal_cache.get(user_id)
+    if current_user is not None:
+        return current_user
+
+    result = await session.execute(user_by_id, {'user_id': user_id})
+    user = result.scalar_one_or_none()
+
+    if not user:
+        raise HTTPException(status_code=404, detail='User not found')
+
+    current_user = CurrentUserSchema.model_validate(user)
+    principal_cache.set(user_id, current_user)
+    return current_user
+
+
+async def get_current_admin(session: session_dep, payload: TokenPayload = Depends(get_token_payload)) -> int:
+    user_id = int(payload.sub)
+
+#   Authorised from the token claims; only the token version is checked, usually from memory
+    if not getattr(payload, 'is_admin', False):
+        raise HTTPException(status_code=403, detail='You are not an admin')
+
+    token_version = token_version_cache.get(user_id)
+
+    if token_version is None:
+        result = await session.execute(user_token_version, {'user_id': user_id})
+        token_version = result.scalar_one_or_none()
+
+        if token_version is None:
+            raise HTTPException(status_code=404, detail='User not found')
+
+        token_version_cache.set(user_id, token_version)
+
+    if getattr(payload, 'ver', None) != token_version:
+        raise HTTPException(status_code=401, detail='Token was revoked, please sign in again')
+
+    return user_id
+
+
+user_id_dep = Annotated[int, Depends(get_user_id)]
+current_user_dep = Annotated[CurrentUserSchema, Depends(get_current_user)]
+admin_dep = Annotated[int, Depends(get_current_admin)]
@@ -0,0 +1,88 @@
+from sqlalchemy import select, func
+
+from backend.database.database import env
+from backend.models.models import CartItemModel, CartModel, ProductModel
+from backend.services.cache import TTLCache
+
+
+# user_id -> rendered /cart/get_info payload. Every cart mutation calls invalidate_cart_view()
+cart_view_cache = TTLCache(
+    maxsize=env.int('CART_VIEW_CACHE_SIZE', default=10000),
+    ttl=env.float('CART_VIEW_CACHE_TTL', default=10.0),
+)
+
+
+# Bumped by every invalidation, so a view read before it is not cached after it
+cart_view_versions = {}
+cart_view_generation = 0
+
+
+def invalidate_cart_view(user_id: int):
+    cart_view_versions[user_id] = cart_view_versions.get(user_id, 0) + 1
+    cart_view_cache.pop(user_id)
+
+
+def invalidate_all_cart_views():
+    global cart_view_generation
+    cart_view_generation += 1
+    cart_view_cache.clear()
+
+
+def line_total(price, quantity):
+    """price * quantity of one line; cart totals and order totals are all SUMs of this, computed by the database."""
+    return price * quantity
+
+
+def cart_lines(cart_id, *criteria):
+    """The cart's lines joined to their products; a line whose product is gone has no price and drops out."""
+    return (
+        select(CartItemModel.product_id, ProductModel.name, ProductModel.price, CartItemModel.quantity)
+        .select_from(CartItemModel)
+        .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+        .where(CartItemModel.cart_id == cart_id, *criteria)
+    )
+
+
+async def get_cart_view(session, user_id: int) -> dict:
+    cached = cart_view_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    version = (cart_view_generation, cart_view_versions.get(user_id, 0))
+
+    total = line_total(ProductModel.price, CartItemModel.quantity)
+
+#   One joined query with only the columns the view needs; the cart total comes along as a window SUM
+    query = (
+        select(
+            CartItemModel.id,
+            CartItemModel.product_id,
+            ProductModel.name,
+            ProductModel.price,
+            CartItemModel.quantity,
+            total.label('total'),
+            func.sum(total).over().label('cart_total'),
+        )
+        .join(CartModel, CartModel.id == CartItemModel.cart_id)
+        .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+        .where(CartModel.user_id == user_id)
+        .order_by(CartItemModel.id)
+    )
+    result = await session.execute(query)
+    rows = result.all()
+
+    view = {
+        'cart_items': [{
+            'cart_item_id': row.id,
+            'product_id': row.product_id,
+            'name': row.name,
+            'price': row.price,
+            'quantity': row.quantity,
+            'total': row.total
+        } for row in rows],
+        'total_price': rows[0].cart_total if rows else 0
+    }
+
+    if version == (cart_view_generation, cart_view_versions.get(user_id, 0)):
+        cart_view_cache.set(user_id, view)
+    return view
@@ -0,0 +1,56 @@
+import hashlib
+import time
+import uuid
+
+from backend.database.database import env, pin_reads_to_primary
+from backend.services.cache import TTLCache
+from backend.services.cart import invalidate_all_cart_views
+
+
+CATALOG_CACHE_TTL = env.float('CATALOG_CACHE_TTL', default=300.0)
+
+# Catalog reads are served from here; every admin mutation of categories/products calls invalidate_catalog()
+catalog_cache = TTLCache(
+    maxsize=env.int('CATALOG_CACHE_SIZE', default=512),
+    ttl=CATALOG_CACHE_TTL,
+)
+
+# Bumped on every catalog mutation in this process. The boot id keeps ETags from a previous process from matching this one
+catalog_boot_id = uuid.uuid4().hex[:12]
+catalog_version = 0
+
+
+def invalidate_catalog():
+    global catalog_version
+    catalog_version += 1
+    catalog_cache.clear()
+#   Cached cart views embed product names and prices
+    invalidate_all_cart_views()
+#   Don't let a lagging replica refill the caches with the old catalog
+    pin_reads_to_primary()
+
+
+def current_catalog_version() -> int:
+    return catalog_version
+
+
+def cache_catalog(key, value, version: int):
+#   A read that started before an invalidation must not put its page back afterwards
+    if version == catalog_version:
+        catalog_cache.set(key, value)
+
+
+def catalog_etag(*parts) -> str:
+#   Other workers never see this process's version bumps, so the ETag also rolls over every
+#   CATALOG_CACHE_TTL: a worker that missed a mutation stops answering 304 as soon as its cached pages expire
+    bucket = int(time.time() // CATALOG_CACHE_TTL) if CATALOG_CACHE_TTL > 0 else 0
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+    return f'"{catalog_boot_id}-{catalog_version}-{bucket}-{digest}"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    if not if_none_match:
+        return False
+
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+
+from backend.database.database import env
+from backend.database.hash import hashing_password, pwd_context
+
+
+# bcrypt releases the GIL, so a thread pool keeps it off the event loop without pickling overhead
+HASH_WORKERS = env.int('HASH_WORKERS', default=4)
+HASH_MAX_CONCURRENCY = env.int('HASH_MAX_CONCURRENCY', default=HASH_WORKERS)
+
+hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='bcrypt')
+hash_semaphore = asyncio.Semaphore(HASH_MAX_CONCURRENCY)
+
+hash_metrics = {
+    'waiting': 0,
+    'running': 0,
+    'max_waiting': 0,
+    'completed': 0,
+    'total_wait_ms': 0.0,
+    'total_run_ms': 0.0,
+}
+
+
+async def run_hashing(func, *args):
+    hash_metrics['waiting'] += 1
+    hash_metrics['max_waiting'] = max(hash_metrics['max_waiting'], hash_metrics['waiting'])
+    queued_at = time.perf_counter()
+
+    try:
+        await hash_semaphore.acquire()
+    finally:
+        hash_metrics['waiting'] -= 1
+
+    hash_metrics['running'] += 1
+    started_at = time.perf_counter()
+    hash_metrics['total_wait_ms'] += (started_at - queued_at) * 1000
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(hash_executor, func, *args)
+    finally:
+        hash_semaphore.release()
+        hash_metrics['running'] -= 1
+        hash_metrics['completed'] += 1
+        hash_metrics['total_run_ms'] += (time.perf_counter() - started_at) * 1000
+
+
+async def hash_password(password: str) -> str:
+    return await run_hashing(hashing_password, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await run_hashing(pwd_context.verify, password, hashed)
+
+
+def hashing_stats() -> dict:
+    completed = hash_metrics['completed']
+    return {
+        'workers': HASH_WORKERS,
+        'max_concurrency': HASH_MAX_CONCURRENCY,
+        'waiting': hash_metrics['waiting'],
+        'running': hash_metrics['running'],
+        'max_waiting': hash_metrics['max_waiting'],
+        'completed': completed,
+        'avg_wait_ms': round(hash_metrics['total_wait_ms'] / completed, 3) if completed else 0.0,
+        'avg_run_ms': round(hash_metrics['total_run_ms'] / completed, 3) if completed else 0.0,
+    }
@@ -0,0 +1,129 @@
+from fastapi import Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta
+from typing import Annotated, Optional
+import hashlib
+import json
+import time
+
+from backend.database.database import env, new_session
+from backend.models.models import IdempotencyKeyModel
+from backend.services.cache import TTLCache
+
+
+IDEMPOTENCY_TTL = env.float('IDEMPOTENCY_TTL', default=86400.0)
+
+
+class MemoryIdempotencyStore:
+    """Keys live in this process only; enough for a single worker."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.records = TTLCache(maxsize=maxsize, ttl=ttl)
+
+#   Returns None when the key is new (and now taken), otherwise the stored record
+    async def claim(self, key: str, fingerprint: str):
+        record = self.records.get(key)
+        if record is None:
+            self.records.set(key, {'fingerprint': fingerprint, 'response': None})
+        return record
+
+    async def complete(self, key: str, fingerprint: str, response):
+        self.records.set(key, {'fingerprint': fingerprint, 'response': response})
+
+    async def release(self, key: str):
+        self.records.pop(key)
+
+
+class DatabaseIdempotencyStore:
+    """Keys live in the idempotency_keys table, so every worker sees the same ones."""
+
+    def __init__(self, ttl: float, purge_interval: float = 60.0):
+        self.ttl = timedelta(seconds=ttl)
+        self.purge_interval = purge_interval
+        self.purged_at = 0.0
+
+    async def claim(self, key: str, fingerprint: str):
+        now = datetime.utcnow()
+
+        async with new_session() as session:
+            dml_insert = pg_insert if session.get_bind().dialect.name == 'postgresql' else sqlite_insert
+
+#           Keep the table bounded: drop expired keys now and then instead of on every request
+            if time.monotonic() - self.purged_at >= self.purge_interval:
+                self.purged_at = time.monotonic()
+                await session.execute(delete(IdempotencyKeyModel).where(IdempotencyKeyModel.created_at < now - self.ttl))
+            else:
+                await session.execute(delete(IdempotencyKeyModel).where(IdempotencyKeyModel.key == key, IdempotencyKeyModel.created_at < now - self.ttl))
+
+#           Whoever inserts the row owns the key, everybody else reads what is stored under it
+            result = await session.execute(
+                dml_insert(IdempotencyKeyModel)
+                .values(key=key, fingerprint=fingerprint, created_at=now)
+                .on_conflict_do_nothing(index_elements=[IdempotencyKeyModel.key])
+                .returning(IdempotencyKeyModel.key)
+            )
+            claimed = result.scalar_one_or_none() is not None
+            await session.commit()
+
+            if claimed:
+                return None
+
+            result = await session.execute(select(IdempotencyKeyModel.fingerprint, IdempotencyKeyModel.response).where(IdempotencyKeyModel.key == key))
+            record = result.first()
+
+        if record is None:
+            return None
+
+        return {'fingerprint': record.fingerprint, 'response': json.loads(record.response) if record.response is not None else None}
+
+    async def complete(self, key: str, fingerprint: str, response):
+        async with new_session() as session:
+            record = await session.get(IdempotencyKeyModel, key)
+            if record is not None:
+                record.response = json.dumps(response)
+                await session.commit()
+
+    async def release(self, key: str):
+        async with new_session() as session:
+            await session.execute(delete(IdempotencyKeyModel).where(IdempotencyKeyModel.key == key))
+            await session.commit()
+
+
+if env.str('IDEMPOTENCY_STORE', default='memory') == 'database':
+    idempotency_store = DatabaseIdempotencyStore(ttl=IDEMPOTENCY_TTL)
+else:
+    idempotency_store = MemoryIdempotencyStore(maxsize=env.int('IDEMPOTENCY_CACHE_SIZE', default=10000), ttl=IDEMPOTENCY_TTL)
+
+
+idempotency_key_dep = Annotated[Optional[str], Header(alias='Idempotency-Key', min_length=1, max_length=255)]
+
+
+async def run_idempotent(idempotency_key: Optional[str], scope: str, payload, handler):
+    if idempotency_key is None:
+        return await handler()
+
+    key = f'{scope}:{idempotency_key}'
+    fingerprint = hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode('utf-8')).hexdigest()
+
+    record = await idempotency_store.claim(key, fingerprint)
+
+    if record is not None:
+        if record['fingerprint'] != fingerprint:
+            raise HTTPException(status_code=422, detail='This Idempotency-Key was already used with a different request')
+        if record['response'] is None:
+            raise HTTPException(status_code=409, detail='A request with this Idempotency-Key is still in progress')
+        return JSONResponse(record['response'], headers={'Idempotent-Replayed': 'true'})
+
+#   Only successful responses are kept: after an error the key is free and a retry runs the handler again
+    try:
+        response = await handler()
+    except BaseException:
+        await idempotency_store.release(key)
+        raise
+
+    await idempotency_store.complete(key, fingerprint, jsonable_encoder(response))
+    return response
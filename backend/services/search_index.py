@@ -0,0 +1,116 @@
+from collections import defaultdict
+from sqlalchemy import select
+import time
+
+from backend.models.models import ProductModel
+from backend.services.catalog_cache import CATALOG_CACHE_TTL
+
+
+def trigrams(text: str) -> set:
+    # Same padding as pg_trgm, so both backends rank roughly alike
+    grams = set()
+    for word in text.lower().split():
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class ProductSearchIndex:
+    """In-memory trigram inverted index over ProductModel.name, used when the database has no pg_trgm.
+
+    Admin edits made in this process update it in place; it is rebuilt from the database once it is
+    older than `ttl`, so edits made through other workers show up within that time.
+    """
+
+    def __init__(self, threshold: float = 0.5, ttl: float = 300.0):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.loaded = False
+        self.loaded_at = 0.0
+        self._names = {}
+        self._grams = {}
+        self._postings = defaultdict(set)
+
+    async def ensure_loaded(self, session):
+        if self.loaded and time.monotonic() - self.loaded_at < self.ttl:
+            return
+
+        result = await session.execute(select(ProductModel.id, ProductModel.name))
+        rows = result.all()
+
+#       No await between the reset and the last add, so a concurrent search never sees a half-built index
+        self.reset()
+        for product_id, name in rows:
+            self.add(product_id, name)
+
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+    def add(self, product_id: int, name: str):
+        self.remove(product_id)
+
+        grams = trigrams(name)
+        self._names[product_id] = name.lower()
+        self._grams[product_id] = grams
+
+        for gram in grams:
+            self._postings[gram].add(product_id)
+
+    def remove(self, product_id: int):
+        grams = self._grams.pop(product_id, None)
+        self._names.pop(product_id, None)
+
+        if not grams:
+            return
+
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(product_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def reset(self):
+        self.loaded = False
+        self._names.clear()
+        self._grams.clear()
+        self._postings.clear()
+
+    def search(self, q: str, limit: int, offset: int = 0) -> list:
+        needle = q.lower().strip()
+        query_grams = trigrams(needle)
+
+        if not query_grams:
+            return []
+
+#       Count shared trigrams per candidate straight from the postings lists
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for product_id in self._postings.get(gram, ()):
+                shared[product_id] += 1
+
+#       Padded trigrams only line up at word starts, so a mid-word substring shares none of them;
+#       scan the names for it too, to match what ILIKE finds on PostgreSQL
+        for product_id, name in self._names.items():
+            if product_id not in shared and needle in name:
+                shared[product_id] = 0
+
+        ranked = []
+        for product_id, common in shared.items():
+            name = self._names[product_id]
+#           Share of the query found in the name (like pg_trgm word_similarity), so typos in one word still match
+            score = common / len(query_grams)
+            similarity = common / len(query_grams | self._grams[product_id])
+            is_substring = needle in name
+
+            if score < self.threshold and not is_substring:
+                continue
+
+            ranked.append((not name.startswith(needle), not is_substring, -score, -similarity, product_id))
+
+        ranked.sort()
+        return [(product_id, -neg_score) for _, _, neg_score, _, product_id in ranked[offset:offset + limit]]
+
+
+product_search_index = ProductSearchIndex(ttl=CATALOG_CACHE_TTL)
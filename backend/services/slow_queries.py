@@ -0,0 +1,83 @@
+from collections import deque
+from datetime import datetime
+import json
+import logging
+
+from backend.database.database import env
+
+
+logger = logging.getLogger('backend.sql')
+
+# A negative threshold turns the log off. envparse's float cast drops the minus sign, so parse it here
+SLOW_QUERY_MS = float(env.str('SLOW_QUERY_MS', default='200'))
+SLOW_QUERY_EXPLAIN = env.bool('SLOW_QUERY_EXPLAIN', default=True)
+
+# Only the latest slow statements are kept, so a bad spell can't grow memory
+slow_queries = deque(maxlen=env.int('SLOW_QUERY_LOG_SIZE', default=100))
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def parameter_shape(parameters, executemany: bool):
+#   Types only: bound values may be passwords or card numbers
+    if executemany:
+        return {'rows': len(parameters), 'row': parameter_shape(parameters[0], False) if parameters else None}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def explain(conn, statement: str, parameters) -> list:
+    if conn.dialect.name == 'sqlite':
+        result = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)
+        return [str(row[-1]) for row in result]
+
+#   A failed EXPLAIN must not abort the request's own transaction on PostgreSQL
+    conn.exec_driver_sql('SAVEPOINT slow_query_explain')
+    try:
+        result = conn.exec_driver_sql(f'EXPLAIN {statement}', parameters)
+        plan = [str(row[0]) for row in result]
+    except Exception:
+        conn.exec_driver_sql('ROLLBACK TO SAVEPOINT slow_query_explain')
+        raise
+    conn.exec_driver_sql('RELEASE SAVEPOINT slow_query_explain')
+    return plan
+
+
+def record_if_slow(conn, statement: str, parameters, executemany: bool, duration_ms: float, scope):
+    if SLOW_QUERY_MS < 0 or duration_ms < SLOW_QUERY_MS:
+        return
+
+    route = None
+    if scope is not None:
+        route = scope['route'].path if scope.get('route') is not None else scope.get('path')
+        route = f"{scope.get('method')} {route}"
+
+    plan = []
+    if SLOW_QUERY_EXPLAIN and not executemany and statement.lstrip().upper().startswith(EXPLAINABLE):
+#       The EXPLAIN runs on the same connection; the flag keeps it out of the metrics and out of this log
+        conn.info['explaining'] = True
+        try:
+            plan = explain(conn, statement, parameters)
+        except Exception as exc:
+            plan = [f'EXPLAIN failed: {exc}']
+        finally:
+            conn.info['explaining'] = False
+
+    entry = {
+        'at': datetime.utcnow(),
+        'route': route,
+        'duration_ms': round(duration_ms, 3),
+        'statement': statement,
+        'parameters': parameter_shape(parameters, executemany),
+        'plan': plan,
+    }
+    slow_queries.append(entry)
+
+    logger.warning(json.dumps({'event': 'slow_query', **entry, 'at': entry['at'].isoformat()}))
+
+
+def slow_query_log() -> list:
+    return list(reversed(slow_queries))
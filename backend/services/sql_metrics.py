@@ -0,0 +1,108 @@
+from fastapi import Depends, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from contextvars import ContextVar
+import json
+import logging
+import time
+
+from backend.database.database import env, engine, read_engines
+from backend.services.slow_queries import record_if_slow
+
+
+logger = logging.getLogger('backend.sql')
+
+# For tests/CI: a route that runs more statements than its query_budget() answers 500 instead of just logging
+SQL_QUERY_BUDGET_STRICT = env.bool('SQL_QUERY_BUDGET_STRICT', default=False)
+
+request_sql = ContextVar('request_sql', default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if conn.info.get('explaining'):
+        return
+    conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if conn.info.get('explaining'):
+        return
+
+    duration_ms = (time.perf_counter() - conn.info['query_started_at'].pop()) * 1000
+    stats = request_sql.get()
+
+    record_if_slow(conn, statement, parameters, executemany, duration_ms, stats['scope'] if stats is not None else None)
+
+    if stats is None:
+        return
+
+    stats['statements'] += 1
+    stats['db_ms'] += duration_ms
+#   Drivers report affected rows for DML; SELECTs mostly report -1
+    if cursor.rowcount and cursor.rowcount > 0:
+        stats['rows'] += cursor.rowcount
+
+
+for instrumented_engine in [engine, *read_engines]:
+    event.listen(instrumented_engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(instrumented_engine.sync_engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def start_request(request: Request) -> dict:
+    stats = {'statements': 0, 'db_ms': 0.0, 'rows': 0, 'budget': None, 'streaming': False, 'started_at': time.perf_counter(), 'scope': request.scope}
+    request_sql.set(stats)
+    return stats
+
+
+def query_budget(limit: int):
+    def declare_budget():
+        stats = request_sql.get()
+        if stats is not None:
+            stats['budget'] = limit
+
+    return Depends(declare_budget)
+
+
+def streamed_response():
+#   A streamed body runs its queries after finish_request(), so the counts here would only cover the handler
+    def declare_streaming():
+        stats = request_sql.get()
+        if stats is not None:
+            stats['streaming'] = True
+
+    return Depends(declare_streaming)
+
+
+def finish_request(request: Request, response, stats: dict):
+    total_ms = (time.perf_counter() - stats['started_at']) * 1000
+    route = request.scope.get('route')
+    path = route.path if route is not None else request.url.path
+
+    over_budget = stats['budget'] is not None and stats['statements'] > stats['budget']
+
+    if stats['statements'] or over_budget:
+        logger.log(logging.WARNING if over_budget else logging.INFO, json.dumps({
+            'event': 'request_sql',
+            'method': request.method,
+            'route': path,
+            'status': response.status_code,
+            'statements': stats['statements'],
+            'rows': stats['rows'],
+            'db_ms': round(stats['db_ms'], 3),
+            'total_ms': round(total_ms, 3),
+            'budget': stats['budget'],
+            'streaming': stats['streaming'],
+        }))
+
+    if over_budget and SQL_QUERY_BUDGET_STRICT:
+        response = JSONResponse(
+            status_code=500,
+            content={'detail': f"Query budget exceeded on {request.method} {path}: {stats['statements']} statements, budget {stats['budget']}"}
+        )
+
+#   No Server-Timing for streamed bodies: "0 statements" there would be wrong, not just incomplete
+    if stats['streaming']:
+        return response
+
+    response.headers['Server-Timing'] = f'db;dur={stats["db_ms"]:.3f};desc="{stats["statements"]} statements", app;dur={total_ms:.3f}'
+    return response
@@ -0,0 +1,16 @@
+from sqlalchemy import select, bindparam
+
+from backend.models.models import UserModel, CardModel, CartModel
+
+
+# Built once with named bind parameters and executed as session.execute(stmt, {'user_id': ...}).
+# Handlers no longer rebuild these selects per request, and because the same object is reused
+# its cache key is computed once, so every execution goes straight to the compiled-SQL cache
+user_by_id = select(UserModel).where(UserModel.id == bindparam('user_id'))
+user_by_email = select(UserModel).where(UserModel.email == bindparam('email'))
+user_token_version = select(UserModel.token_version).where(UserModel.id == bindparam('user_id'))
+
+card_by_user_id = select(CardModel).where(CardModel.user_id == bindparam('user_id'))
+card_id_by_user_id = select(CardModel.id).where(CardModel.user_id == bindparam('user_id'))
+
+cart_id_by_user_id = select(CartModel.id).where(CartModel.user_id == bindparam('user_id'))
@@ -0,0 +1,71 @@
+"""Times checkout and cart clearing against carts of 1, 100 and 1000 lines.
+
+    python benchmarks/checkout_cart_size.py [--sizes 1 100 1000] [--rounds 10]
+
+Both routes remove the lines with one set-based DELETE, so clearing stays close to flat as
+the cart grows. Checkout still grows with the cart, because it copies every line into the
+order ledger. "per-row delete" replays the old clear on the same data, without the HTTP
+round trip: load every line, then one session.delete() per row at flush.
+"""
+import argparse
+import asyncio
+
+from harness import reset_database, seed_products, signed_in_client, timed, summary
+
+from sqlalchemy import insert, select
+
+from backend.database.database import new_session
+from backend.models.models import CartItemModel, CartModel, UserModel
+
+
+async def fill_cart(email: str, product_ids: list):
+    async with new_session() as session:
+        result = await session.execute(select(CartModel.id).join(UserModel, UserModel.id == CartModel.user_id).where(UserModel.email == email))
+        cart_id = result.scalar_one()
+        await session.execute(insert(CartItemModel), [{'cart_id': cart_id, 'product_id': product_id, 'quantity': 1} for product_id in product_ids])
+        await session.commit()
+        return cart_id
+
+
+async def per_row_delete(cart_id: int):
+    async with new_session() as session:
+        result = await session.execute(select(CartItemModel).where(CartItemModel.cart_id == cart_id))
+        for item in result.scalars().all():
+            await session.delete(item)
+        await session.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    await reset_database()
+    product_ids = await seed_products(max(args.sizes))
+    email = 'bench@shop.com'
+    client = await signed_in_client(email, balance=10 ** 9)
+
+    for size in args.sizes:
+        checkout, clear, baseline = [], [], []
+
+        for _ in range(args.rounds):
+            await fill_cart(email, product_ids[:size])
+            checkout.append(await timed(lambda: client.put('/payment/pay_for_all_items')))
+
+            await fill_cart(email, product_ids[:size])
+            clear.append(await timed(lambda: client.delete('/cart/delete_all_items')))
+
+            cart_id = await fill_cart(email, product_ids[:size])
+            baseline.append(await timed(lambda: per_row_delete(cart_id)))
+
+        print(f'{size} lines')
+        print(f'  pay_for_all_items   {summary(checkout)}')
+        print(f'  delete_all_items    {summary(clear)}')
+        print(f'  per-row delete      {summary(baseline)}')
+
+    await client.aclose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""Hammers one card with concurrent single-item checkouts: today's conditional UPDATE against the old read-check-write.
+
+    python benchmarks/checkout_contention.py [--lines 200] [--concurrency 50]
+
+The cart holds --lines items and the balance covers half of them. Every line is paid for with
+its own request, --concurrency at a time. "read-check-write" is the checkout this repo had
+before: read the card, compare in Python, assign the new balance and commit. It is mounted on
+the same app behind the same auth, so both sides pay the same HTTP and session overhead.
+
+Besides throughput, each run reports how many lines were paid for and whether the balance
+still equals start minus what was paid. Lost updates make it higher, overdrafts push it below 0.
+The current route also writes the order ledger and diagnoses its 400s, which the old one never did.
+"""
+import argparse
+import asyncio
+import time
+
+from harness import reset_database, seed_products, signed_in_client, summary
+
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from sqlalchemy import insert, select
+
+from main import app
+from backend.database.database import new_session, session_dep
+from backend.models.models import CardModel, CartItemModel, CartModel, ProductModel
+from backend.schemas.payment_schema import PayItemSchema
+from backend.services.auth import user_id_dep
+
+
+PRICE = 10.0
+
+
+async def read_check_write(data: PayItemSchema, session: session_dep, user_id: user_id_dep):
+    result = await session.execute(
+        select(CartItemModel, ProductModel.price)
+        .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+        .join(CartModel, CartModel.id == CartItemModel.cart_id)
+        .where(CartItemModel.id == data.cart_item_id, CartModel.user_id == user_id)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail='There is no such product in your cart')
+    item, price = row
+
+    result = await session.execute(select(CardModel).where(CardModel.user_id == user_id))
+    card = result.scalar_one()
+
+    final_price = price * item.quantity
+    if card.balance < final_price:
+        raise HTTPException(status_code=400, detail='Not enough balance on your card')
+
+    card.balance -= final_price
+    await session.delete(item)
+    await session.commit()
+    return {'success': True, 'message': f'Paid {final_price} for the product'}
+
+
+async def fill_cart(product_ids: list) -> list:
+    async with new_session() as session:
+        cart_id = (await session.execute(select(CartModel.id))).scalar_one()
+        result = await session.execute(
+            insert(CartItemModel).returning(CartItemModel.id),
+            [{'cart_id': cart_id, 'product_id': product_id, 'quantity': 1} for product_id in product_ids]
+        )
+        item_ids = list(result.scalars().all())
+        await session.commit()
+        return item_ids
+
+
+async def run(path: str, lines: int, concurrency: int):
+    await reset_database()
+    product_ids = await seed_products(lines, price=PRICE)
+    start_balance = PRICE * lines / 2
+    client = await signed_in_client('bench@shop.com', balance=start_balance)
+    item_ids = await fill_cart(product_ids)
+
+    gate = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def pay(item_id: int) -> int:
+        async with gate:
+            started_at = time.perf_counter()
+            response = await client.put(path, json={'cart_item_id': item_id})
+            timings.append((time.perf_counter() - started_at) * 1000)
+            return response.status_code
+
+    started_at = time.perf_counter()
+    statuses = await asyncio.gather(*[pay(item_id) for item_id in item_ids])
+    elapsed = time.perf_counter() - started_at
+
+    async with new_session() as session:
+        balance = (await session.execute(select(CardModel.balance))).scalar_one()
+    await client.aclose()
+
+    paid = statuses.count(200)
+    print(f'{path}')
+    print(f'  {len(item_ids) / elapsed:8.1f} checkouts/s   {summary(timings)}')
+    print(f'  paid {paid} of {lines}, balance {balance:.2f}, expected {start_balance - paid * PRICE:.2f}, other statuses {sorted(set(statuses) - {200, 400})}')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+#   Ahead of the static mount at "/", which would match anything
+    app.router.routes.insert(0, APIRoute('/bench/read_check_write', read_check_write, methods=['PUT']))
+
+    await run('/payment/pay_for_one_item', args.lines, args.concurrency)
+    await run('/bench/read_check_write', args.lines, args.concurrency)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
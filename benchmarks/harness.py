@@ -0,0 +1,96 @@
+"""Shared setup for the benchmarks that drive the app: a throwaway database and signed-in clients.
+
+Import this before anything from backend or main. The database is dropped and recreated, so it
+is a fresh SQLite file unless BENCH_DATABASE_URL points somewhere else on purpose.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = tempfile.mkdtemp(prefix='shop-bench-')
+os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL', f'sqlite+aiosqlite:///{BENCH_DIR}/shop.db')
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key-that-is-long-enough-for-hs256')
+os.environ['SQL_QUERY_BUDGET_STRICT'] = 'false'
+os.environ.setdefault('SLOW_QUERY_MS', '-1')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import insert, update
+
+from main import app
+from backend.database.database import Base, engine, new_session
+from backend.models.models import CategoryModel, ProductModel, UserModel, CardModel
+from backend.services.auth import principal_cache, token_version_cache
+from backend.services.cart import cart_view_cache
+from backend.services.catalog_cache import catalog_cache
+from backend.services.search_index import product_search_index
+
+
+PASSWORD = 'password1'
+CARD_PASSWORD = 'cardpass1'
+
+
+async def reset_database():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    for cache in (catalog_cache, cart_view_cache, principal_cache, token_version_cache):
+        cache.clear()
+    product_search_index.reset()
+
+
+async def seed_products(count: int, price: float = 1.0) -> list:
+    async with new_session() as session:
+        category = CategoryModel(name='Bench')
+        session.add(category)
+        await session.flush()
+
+        base = datetime(2025, 1, 1)
+        result = await session.execute(
+            insert(ProductModel).returning(ProductModel.id),
+            [
+                {'name': f'Product {i}', 'price': price, 'image_path': '/static/x.jpg', 'category_id': category.id, 'created_at': base + timedelta(seconds=i)}
+                for i in range(count)
+            ]
+        )
+        product_ids = list(result.scalars().all())
+        await session.commit()
+
+    return product_ids
+
+
+async def signed_in_client(email: str, balance: float = None, admin: bool = False) -> httpx.AsyncClient:
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://testserver')
+
+    await client.post('/users/sign_up', json={'email': email, 'password': PASSWORD, 'repeat_password': PASSWORD, 'name': 'Bench'})
+    if admin:
+        async with new_session() as session:
+            await session.execute(update(UserModel).where(UserModel.email == email).values(is_admin=True))
+            await session.commit()
+    await client.post('/users/sign_in', json={'email': email, 'password': PASSWORD})
+
+    if balance is not None:
+        response = await client.post('/card/create_card', json={'user_password': PASSWORD, 'card_password': CARD_PASSWORD, 'repeat_card_password': CARD_PASSWORD})
+        async with new_session() as session:
+            await session.execute(update(CardModel).where(CardModel.id == response.json()['info']['id']).values(balance=balance))
+            await session.commit()
+
+    return client
+
+
+async def timed(call) -> float:
+    """Milliseconds one awaited call took."""
+    started_at = time.perf_counter()
+    await call()
+    return (time.perf_counter() - started_at) * 1000
+
+
+def summary(timings: list) -> str:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f'median {statistics.median(ordered):8.2f} ms   p95 {p95:8.2f} ms   n={len(ordered)}'
@@ -0,0 +1,62 @@
+"""Per-call Python overhead of building a lookup select versus reusing one from statements.py.
+
+    python benchmarks/prebuilt_statements.py [--number 20000]
+
+"fresh select" is what the handlers used to do on every request: build the construct and let
+SQLAlchemy compute its cache key to find the compiled SQL. A prebuilt statement has its cache
+key memoized after the first call. The last two rows execute both forms against SQLite to
+show what that saving is worth next to a real round trip.
+"""
+import argparse
+import asyncio
+import timeit
+
+from harness import reset_database
+
+from sqlalchemy import select, lambda_stmt
+
+from backend.database.database import new_session
+from backend.models.models import CardModel
+from backend.services.statements import card_by_user_id
+
+
+def fresh_select(user_id: int):
+    return select(CardModel).where(CardModel.user_id == user_id)
+
+
+def per_call_us(number: int, call) -> float:
+    return min(timeit.repeat(call, number=number, repeat=5)) / number * 1e6
+
+
+async def execute_us(number: int, make_statement, params) -> float:
+    async with new_session() as session:
+        await session.execute(make_statement(), params)
+
+        started_at = timeit.default_timer()
+        for _ in range(number):
+            await session.execute(make_statement(), params)
+        return (timeit.default_timer() - started_at) / number * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = {
+        'fresh select + cache key': per_call_us(args.number, lambda: fresh_select(1)._generate_cache_key()),
+        'lambda_stmt + cache key': per_call_us(args.number, lambda: lambda_stmt(lambda: select(CardModel).where(CardModel.user_id == 1))._generate_cache_key()),
+        'prebuilt + cache key': per_call_us(args.number, lambda: card_by_user_id._generate_cache_key()),
+    }
+
+    await reset_database()
+    executions = max(1, args.number // 10)
+    rows['execute fresh select'] = await execute_us(executions, lambda: fresh_select(1), None)
+    rows['execute prebuilt'] = await execute_us(executions, lambda: card_by_user_id, {'user_id': 1})
+
+    for name, us in rows.items():
+        print(f'{name:28} {us:10.2f} µs/call')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""Times serialising a 10k-product page the ways a response can be rendered.
+
+    python benchmarks/serialize_products.py [--products 10000] [--rounds 20]
+
+response_model is the path FastAPI takes for routes with a response model: Pydantic
+validates and dumps straight to JSON bytes. jsonable_encoder + json.dumps is what a bare
+JSONResponse costs, and orjson is shown for comparison when it is installed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from backend.schemas.product_schema import ProductPageSchema
+
+
+def make_page(count: int) -> dict:
+    base = datetime(2025, 1, 1)
+    items = [
+        {
+            'id': i,
+            'name': f'Product {i}',
+            'price': float(1 + i % 500),
+            'created_at': base + timedelta(minutes=i),
+            'image_path': f'/static/products/{i}.jpg',
+            'category_id': 1 + i % 20,
+        }
+        for i in range(1, count + 1)
+    ]
+    return {'items': items, 'next_cursor': None}
+
+
+def best_of(rounds: int, render) -> tuple:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        body = render()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    page = make_page(args.products)
+    adapter = TypeAdapter(ProductPageSchema)
+
+    renderers = {
+        'response_model': lambda: adapter.dump_json(adapter.validate_python(page)),
+        'jsonable_encoder + json.dumps': lambda: json.dumps(jsonable_encoder(page)).encode('utf-8'),
+    }
+
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+    if orjson is not None:
+        renderers['orjson'] = lambda: orjson.dumps(page)
+
+    print(f'{args.products} products, best of {args.rounds}')
+    for name, render in renderers.items():
+        ms, size = best_of(args.rounds, render)
+        print(f'{name:32} {ms:8.2f} ms  {size / 1024:8.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
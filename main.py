@@ -1,10 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
 
 from backend.router import main_router
+from backend.database.database import read_engines, READ_PRIMARY_COOKIE, DB_READ_STICKY_SECONDS
+from backend.services.sql_metrics import start_request, finish_request
 
 app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
 
@@ -18,6 +20,25 @@ app.add_middleware(
     allow_headers=['*']
 )
 
+
+@app.middleware('http')
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+
+#   After a successful change this client reads from the primary for a while, so it never sees a lagging replica
+    if read_engines and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        response.set_cookie(READ_PRIMARY_COOKIE, '1', max_age=DB_READ_STICKY_SECONDS, httponly=True, samesite='lax')
+
+    return response
+
+
+@app.middleware('http')
+async def sql_metrics(request: Request, call_next):
+#   Statements, rows and DB time of this request go to the Server-Timing header and the backend.sql log
+    stats = start_request(request)
+    response = await call_next(request)
+    return finish_request(request, response, stats)
+
 frontend_path = os.path.join(os.path.dirname(__file__), "frontend")
 app.mount("/", StaticFiles(directory=frontend_path, html=True), name="index.html")
 
@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+
+# The app reads its settings at import time, so point it at a throwaway SQLite file first
+TEST_DIR = tempfile.mkdtemp(prefix='shop-tests-')
+os.environ['DATABASE_URL'] = f'sqlite+aiosqlite:///{TEST_DIR}/shop.db'
+os.environ['SECRET_KEY'] = 'test-secret-key-that-is-long-enough-for-hs256'
+# Routes that run more statements than their query_budget() fail with a 500
+os.environ['SQL_QUERY_BUDGET_STRICT'] = 'true'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import update
+
+from main import app
+from backend.database.database import Base, engine, new_session
+from backend.models.models import CategoryModel, ProductModel, UserModel, CardModel
+from backend.services.auth import principal_cache, token_version_cache
+from backend.services.cart import cart_view_cache
+from backend.services.catalog_cache import catalog_cache
+from backend.services.idempotency import idempotency_store
+from backend.services.search_index import product_search_index
+
+
+PASSWORD = 'password1'
+CARD_PASSWORD = 'cardpass1'
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+async def db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    for cache in (catalog_cache, cart_view_cache, principal_cache, token_version_cache):
+        cache.clear()
+    product_search_index.reset()
+    if hasattr(idempotency_store, 'records'):
+        idempotency_store.records.clear()
+
+    yield
+
+#   Connections belong to this test's event loop
+    await engine.dispose()
+
+
+@pytest.fixture
+async def products(db):
+    async with new_session() as session:
+        food, drinks = CategoryModel(name='Food'), CategoryModel(name='Drinks')
+        session.add_all([food, drinks])
+        await session.flush()
+
+        base = datetime(2025, 1, 1)
+        items = [
+            ProductModel(
+                name=f'Product {chr(65 + i % 26)}{i}',
+                price=float(1 + i % 7),
+                image_path='/static/x.jpg',
+                category_id=food.id if i % 2 else drinks.id,
+                created_at=base + timedelta(minutes=i),
+            )
+            for i in range(50)
+        ]
+        session.add_all(items)
+        await session.commit()
+
+        return [product.id for product in items]
+
+
+@pytest.fixture
+async def make_client(db):
+    clients = []
+
+    async def factory(email: str, admin: bool = False, balance: int = None):
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://testserver')
+        clients.append(client)
+
+        response = await client.post('/users/sign_up', json={'email': email, 'password': PASSWORD, 'repeat_password': PASSWORD, 'name': 'Tester'})
+        assert response.status_code == 200, response.text
+
+        if admin:
+            async with new_session() as session:
+                await session.execute(update(UserModel).where(UserModel.email == email).values(is_admin=True))
+                await session.commit()
+
+        response = await client.post('/users/sign_in', json={'email': email, 'password': PASSWORD})
+        assert response.status_code == 200, response.text
+
+        if balance is not None:
+            response = await client.post('/card/create_card', json={'user_password': PASSWORD, 'card_password': CARD_PASSWORD, 'repeat_card_password': CARD_PASSWORD})
+            assert response.json()['success'], response.text
+            async with new_session() as session:
+                await session.execute(update(CardModel).where(CardModel.id == response.json()['info']['id']).values(balance=balance))
+                await session.commit()
+
+        return client
+
+    yield factory
+
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,38 @@
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_delete_product_in_a_cart(make_client, products):
+    admin = await make_client('admin@shop.com', admin=True)
+    user = await make_client('user@shop.com', balance=100)
+
+    await user.post('/cart/add_products_to_cart', json={'items': [{'product_id': products[0], 'quantity': 1}, {'product_id': products[1], 'quantity': 2}]})
+
+    response = await admin.delete('/category/product/delete_product', params={'product_id': products[0]})
+    assert response.status_code == 200, response.text
+
+    cart = (await user.get('/cart/get_info')).json()
+    assert [item['product_id'] for item in cart['cart_items']] == [products[1]]
+
+#   No orphan line is left behind to break the checkout
+    response = await user.put('/payment/pay_for_all_items')
+    assert response.status_code == 200, response.text
+
+
+async def test_delete_category_with_products_in_carts(make_client, products):
+    admin = await make_client('admin@shop.com', admin=True)
+    user = await make_client('user@shop.com')
+
+    categories = (await admin.get('/category/get_category')).json()
+    await user.post('/cart/add_products_to_cart', json={'items': [{'product_id': product_id, 'quantity': 1} for product_id in products[:4]]})
+
+    response = await admin.delete('/category/delete_category', params={'category_id': categories[0]['id']})
+    assert response.status_code == 200, response.text
+
+    page = (await user.get('/category/product/get_products', params={'category_id': categories[0]['id']})).json()
+    assert page['items'] == []
+
+    cart = (await user.get('/cart/get_info')).json()
+    assert len(cart['cart_items']) == 2
@@ -0,0 +1,41 @@
+import pytest
+
+from backend.database.database import engine, session_stats
+from backend.database.pool import pool_stats
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_token_is_read_from_the_cookie_only(make_client):
+    user = await make_client('user@shop.com')
+    assert (await user.get('/cart/get_info')).status_code == 200
+
+    token = user.cookies['token']
+    user.cookies.clear()
+
+    response = await user.get('/cart/get_info', params={'token': token})
+    assert response.status_code == 401
+
+
+async def test_rejected_requests_never_check_out_a_connection(make_client):
+    user = await make_client('user@shop.com')
+    user.cookies.clear()
+    assert (await user.get('/cart/get_info')).status_code == 401
+
+    sessions_before, pool_before = session_stats(), pool_stats(engine)
+
+    for cookie in (None, 'not-a-jwt'):
+        user.cookies.clear()
+        if cookie:
+            user.cookies.set('token', cookie)
+        assert (await user.get('/cart/get_info')).status_code == 401
+        assert (await user.get('/card/get_balance')).status_code == 401
+        assert (await user.put('/payment/pay_for_all_items')).status_code == 401
+
+    sessions_after, pool_after = session_stats(), pool_stats(engine)
+
+#   Every rejected request opened a session, none of them took a connection from the pool
+    assert sessions_after['without_connection'] - sessions_before['without_connection'] == 6
+    assert sessions_after['connected'] == sessions_before['connected']
+    assert pool_after['checkouts'] == pool_before['checkouts']
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from backend.database.database import engine
+from backend.services.cart import cart_view_cache, invalidate_cart_view
+from backend.services.catalog_cache import invalidate_catalog
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_add_unknown_product(make_client, products):
+    user = await make_client('user@shop.com')
+
+    response = await user.post('/cart/add_product_to_cart', json={'product_id': 10 ** 6, 'quantity': 1})
+    assert response.status_code == 404
+    assert response.json()['detail'] == 'Product not found'
+
+
+async def test_parallel_adds_to_one_cart(make_client, products):
+    user = await make_client('user@shop.com')
+
+    responses = await asyncio.gather(*[
+        user.post('/cart/add_product_to_cart', json={'product_id': products[0], 'quantity': quantity})
+        for quantity in range(1, 11)
+    ])
+    assert [response.status_code for response in responses] == [200] * 10
+
+#   Every add lands on the same line: one row, with the quantities summed
+    cart = (await user.get('/cart/get_info')).json()
+    assert [(item['product_id'], item['quantity']) for item in cart['cart_items']] == [(products[0], 55)]
+
+
+async def test_parallel_bulk_adds_to_one_cart(make_client, products):
+    user = await make_client('user@shop.com')
+    items = [{'product_id': product_id, 'quantity': 2} for product_id in products[:3]]
+
+    responses = await asyncio.gather(*[user.post('/cart/add_products_to_cart', json={'items': items}) for _ in range(5)])
+    assert [response.status_code for response in responses] == [200] * 5
+
+    cart = (await user.get('/cart/get_info')).json()
+    assert sorted((item['product_id'], item['quantity']) for item in cart['cart_items']) == [(product_id, 10) for product_id in products[:3]]
+
+
+@pytest.mark.parametrize('invalidate', [lambda: invalidate_cart_view(1), invalidate_catalog])
+async def test_view_read_before_an_invalidation_is_not_cached(make_client, products, invalidate):
+    user = await make_client('user@shop.com')
+    await user.post('/cart/add_product_to_cart', json={'product_id': products[0], 'quantity': 1})
+
+#   An add, a checkout or a catalog edit commits while get_info's SELECT is in flight
+    def change_lands(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith('SELECT') and 'FROM cart_items' in statement:
+            invalidate()
+
+    event.listen(engine.sync_engine, 'after_cursor_execute', change_lands)
+    try:
+        response = await user.get('/cart/get_info')
+    finally:
+        event.remove(engine.sync_engine, 'after_cursor_execute', change_lands)
+
+    assert response.status_code == 200
+    assert len(cart_view_cache) == 0
+
+
+async def test_cannot_change_someone_elses_cart_line(make_client, products):
+    owner = await make_client('owner@shop.com')
+    other = await make_client('other@shop.com')
+
+    await owner.post('/cart/add_product_to_cart', json={'product_id': products[0], 'quantity': 3})
+    cart_item_id = (await owner.get('/cart/get_info')).json()['cart_items'][0]['cart_item_id']
+
+    response = await other.put('/cart/remove_one_item', json={'cart_item_id': cart_item_id, 'amount': 1})
+    assert response.status_code == 404
+    response = await other.request('DELETE', '/cart/delete_product', json={'cart_item_id': cart_item_id})
+    assert response.status_code == 404
+
+    assert (await owner.get('/cart/get_info')).json()['cart_items'][0]['quantity'] == 3
+
+    assert (await owner.put('/cart/remove_one_item', json={'cart_item_id': cart_item_id, 'amount': 1})).status_code == 200
+    assert (await owner.get('/cart/get_info')).json()['cart_items'][0]['quantity'] == 2
+    assert (await owner.request('DELETE', '/cart/delete_product', json={'cart_item_id': cart_item_id})).status_code == 200
+    assert (await owner.get('/cart/get_info')).json()['cart_items'] == []
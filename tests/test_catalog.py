@@ -0,0 +1,80 @@
+import time
+
+import pytest
+from sqlalchemy import event, update
+
+from backend.database.database import engine, new_session
+from backend.models.models import ProductModel
+from backend.services import catalog_cache as catalog_cache_module
+from backend.services.catalog_cache import CATALOG_CACHE_TTL, catalog_cache, invalidate_catalog
+from backend.services.search_index import product_search_index
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def rename_behind_the_cache(product_id: int, name: str):
+#   What another worker's admin edit looks like from here: the row changes, this process is never told
+    async with new_session() as session:
+        await session.execute(update(ProductModel).where(ProductModel.id == product_id).values(name=name))
+        await session.commit()
+
+
+async def test_etag_expires_with_the_cache_ttl(make_client, products, monkeypatch):
+    user = await make_client('user@shop.com')
+
+    first = await user.get('/category/product/get_products', params={'limit': 1, 'sort': 'oldest'})
+    etag = first.headers['ETag']
+    assert (await user.get('/category/product/get_products', params={'limit': 1, 'sort': 'oldest'}, headers={'If-None-Match': etag})).status_code == 304
+
+    await rename_behind_the_cache(products[0], 'Renamed elsewhere')
+
+#   One TTL later the cached pages have expired and the old ETag no longer matches
+    now = time.time() + CATALOG_CACHE_TTL
+    monkeypatch.setattr(catalog_cache_module.time, 'time', lambda: now)
+    catalog_cache.clear()
+
+    response = await user.get('/category/product/get_products', params={'limit': 1, 'sort': 'oldest'}, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json()['items'][0]['name'] == 'Renamed elsewhere'
+
+
+async def test_search_index_is_rebuilt_after_the_ttl(make_client, products):
+    user = await make_client('user@shop.com')
+
+    assert (await user.get('/category/product/search', params={'q': 'Product A0'})).json()['items']
+    await rename_behind_the_cache(products[0], 'Zebra')
+    assert not (await user.get('/category/product/search', params={'q': 'Zebra'})).json()['items']
+
+    product_search_index.loaded_at -= product_search_index.ttl
+
+    hits = (await user.get('/category/product/search', params={'q': 'Zebra'})).json()['items']
+    assert [hit['id'] for hit in hits] == [products[0]]
+
+
+async def test_page_read_before_an_invalidation_is_not_cached(make_client, products):
+    user = await make_client('user@shop.com')
+
+#   An admin edit commits while this reader's SELECT is in flight
+    def edit_lands(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith('SELECT') and 'FROM products' in statement:
+            invalidate_catalog()
+
+    event.listen(engine.sync_engine, 'after_cursor_execute', edit_lands)
+    try:
+        response = await user.get('/category/product/get_products', params={'limit': 1})
+    finally:
+        event.remove(engine.sync_engine, 'after_cursor_execute', edit_lands)
+
+    assert response.status_code == 200
+    assert len(catalog_cache) == 0
+
+
+async def test_search_finds_mid_word_substrings(make_client, products):
+    user = await make_client('user@shop.com')
+
+    page = (await user.get('/category/product/search', params={'q': 'ro', 'limit': 50})).json()
+    assert len(page['items']) == 50
+    assert all('ro' in item['name'].lower() for item in page['items'])
+#   Names with a word starting "r" still rank first
+    assert page['items'][0]['name'].startswith('Product R')
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select, delete
+
+from backend.database.database import new_session
+from backend.models.models import CardModel, ProductModel
+
+from conftest import CARD_PASSWORD
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def card_balance() -> float:
+    async with new_session() as session:
+        result = await session.execute(select(CardModel.balance))
+        return result.scalar_one()
+
+
+async def cart_item_ids(client) -> list:
+    cart = (await client.get('/cart/get_info')).json()
+    return [item['cart_item_id'] for item in cart['cart_items']]
+
+
+async def test_pay_for_all_items(make_client, products):
+    user = await make_client('user@shop.com', balance=100)
+
+    response = await user.put('/payment/pay_for_all_items')
+    assert response.status_code == 404
+
+    await user.post('/cart/add_products_to_cart', json={'items': [{'product_id': products[0], 'quantity': 2}, {'product_id': products[3], 'quantity': 1}]})
+
+    response = await user.put('/payment/pay_for_all_items')
+    assert response.status_code == 200, response.text
+    assert await card_balance() == 100 - (1 * 2 + 4)
+    assert (await user.get('/cart/get_info')).json()['cart_items'] == []
+
+    history = (await user.get('/orders/get_history')).json()
+    assert [order['total'] for order in history['items']] == [6]
+
+
+async def test_fractional_price_leaves_a_fractional_balance(make_client, products):
+    user = await make_client('user@shop.com', balance=100)
+
+    async with new_session() as session:
+        product = ProductModel(name='Fractional', price=9.99, image_path='/static/x.jpg', category_id=1)
+        session.add(product)
+        await session.commit()
+        product_id = product.id
+
+    await user.post('/cart/add_product_to_cart', json={'product_id': product_id, 'quantity': 1})
+    assert (await user.put('/payment/pay_for_all_items')).status_code == 200
+
+    response = await user.get('/card/get_balance')
+    assert response.status_code == 200, response.text
+    assert response.json()['balance'] == pytest.approx(90.01)
+
+    response = await user.get('/card/get_info')
+    assert response.status_code == 200, response.text
+    assert response.json()['info']['balance'] == pytest.approx(90.01)
+
+    response = await user.put('/card/add_balance', json={'amount': 10, 'card_password': CARD_PASSWORD})
+    assert response.status_code == 200, response.text
+    assert response.json()['Your balance'] == pytest.approx(100.01)
+
+
+async def test_not_enough_balance_changes_nothing(make_client, products):
+    user = await make_client('user@shop.com', balance=3)
+    await user.post('/cart/add_products_to_cart', json={'items': [{'product_id': products[6], 'quantity': 1}]})
+
+    response = await user.put('/payment/pay_for_all_items')
+    assert response.status_code == 400
+    assert await card_balance() == 3
+    assert len(await cart_item_ids(user)) == 1
+
+
+async def test_cannot_pay_for_someone_elses_item(make_client, products):
+    owner = await make_client('owner@shop.com', balance=100)
+    other = await make_client('other@shop.com')
+
+    await owner.post('/cart/add_products_to_cart', json={'items': [{'product_id': products[0], 'quantity': 1}]})
+    foreign_id = (await cart_item_ids(owner))[0]
+
+    await other.post('/card/create_card', json={'user_password': 'password1', 'card_password': CARD_PASSWORD, 'repeat_card_password': CARD_PASSWORD})
+    response = await other.put('/payment/pay_for_selected_items', json={'cart_item_ids': [foreign_id]})
+    assert response.status_code == 404
+    assert len(await cart_item_ids(owner)) == 1
+
+
+async def test_line_without_a_product_is_not_charged(make_client, products):
+    user = await make_client('user@shop.com', balance=100)
+    await user.post('/cart/add_products_to_cart', json={'items': [{'product_id': products[0], 'quantity': 1}, {'product_id': products[1], 'quantity': 1}]})
+
+#   Bypasses the admin API, which would drop the line too
+    async with new_session() as session:
+        await session.execute(delete(ProductModel).where(ProductModel.id == products[1]))
+        await session.commit()
+
+    response = await user.put('/payment/pay_for_all_items')
+    assert response.status_code == 200, response.text
+    assert await card_balance() == 100 - 1
+
+
+async def test_concurrent_checkouts_never_overdraw(make_client, products):
+    user = await make_client('user@shop.com', balance=20)
+
+#   Seven lines of 7 each: the balance covers two of them
+    await user.post('/cart/add_products_to_cart', json={'items': [{'product_id': products[6 + 7 * i], 'quantity': 1} for i in range(7)]})
+    ids = await cart_item_ids(user)
+
+    responses = await asyncio.gather(*[user.put('/payment/pay_for_one_item', json={'cart_item_id': cart_item_id}) for cart_item_id in ids])
+    paid = [response for response in responses if response.status_code == 200]
+
+    assert len(paid) == 2
+    assert all(response.status_code in (200, 400) for response in responses)
+    assert await card_balance() == 20 - 2 * 7
+    assert len(await cart_item_ids(user)) == 5
+
+
+async def test_top_up_during_checkout_keeps_both(make_client, products):
+    user = await make_client('user@shop.com', balance=100)
+    await user.post('/cart/add_products_to_cart', json={'items': [{'product_id': products[6], 'quantity': 7}]})
+
+#   add_balance awaits bcrypt on a thread; the checkout commits in that gap
+    top_up, checkout = await asyncio.gather(
+        user.put('/card/add_balance', json={'amount': 10, 'card_password': CARD_PASSWORD}),
+        user.put('/payment/pay_for_all_items'),
+    )
+
+    assert top_up.status_code == 200, top_up.text
+    assert checkout.status_code == 200, checkout.text
+    assert await card_balance() == 100 + 10 - 49
@@ -0,0 +1,108 @@
+from contextlib import closing, contextmanager
+import re
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+from backend.database.database import Base, engine
+
+from conftest import TEST_DIR
+
+
+pytestmark = pytest.mark.anyio
+
+TABLES = set(Base.metadata.tables)
+
+
+@contextmanager
+def captured():
+    """Statements the app sends to the database while the block runs, with their parameters."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', record)
+
+
+def query_plan(statement: str, parameters) -> list:
+    with closing(sqlite3.connect(f'{TEST_DIR}/shop.db')) as conn:
+        return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+
+
+def table_scans(statements) -> list:
+#   SCAN of a subquery, a CTE or a constant row is fine, and so is walking an index in ORDER BY
+#   order under a LIMIT; reading a whole table row by row is not
+    scans = []
+    for statement, parameters in statements:
+        for line in query_plan(statement, parameters):
+            match = re.match(r'SCAN (\w+)', line)
+            if not match or match.group(1) not in TABLES:
+                continue
+            if 'USING' in line and 'INDEX' in line and 'LIMIT' in statement:
+                continue
+            scans.append((line, statement))
+    return scans
+
+
+async def cart_item_ids(client) -> list:
+    cart = (await client.get('/cart/get_info')).json()
+    return [item['cart_item_id'] for item in cart['cart_items']]
+
+
+@pytest.mark.parametrize('sort', ['newest', 'oldest', 'price_asc', 'price_desc'])
+async def test_catalog_pages_use_indexes(make_client, products, sort):
+    user = await make_client('user@shop.com')
+
+    async def pages(**params):
+        first = (await user.get('/category/product/get_products', params={'sort': sort, 'limit': 5, **params})).json()
+        assert first['next_cursor']
+        await user.get('/category/product/get_products', params={'sort': sort, 'limit': 5, 'cursor': first['next_cursor'], **params})
+
+    with captured() as listings:
+        await pages()
+        await pages(category_id=1)
+    with captured() as price_ranges:
+        await pages(min_price=2, max_price=5)
+
+    assert len(listings) == 4 and len(price_ranges) == 2
+    assert table_scans(listings + price_ranges) == []
+#   Listings come off an index in order; a temp B-tree would mean sorting every matching product.
+#   A price range with a date sort has to sort, since no index orders both
+    assert not [line for statement, parameters in listings for line in query_plan(statement, parameters) if 'TEMP B-TREE' in line]
+
+
+async def test_cart_queries_use_indexes(make_client, products):
+    user = await make_client('user@shop.com')
+
+    with captured() as statements:
+        await user.post('/cart/add_product_to_cart', json={'product_id': products[0], 'quantity': 2})
+        await user.post('/cart/add_products_to_cart', json={'items': [{'product_id': products[1], 'quantity': 1}, {'product_id': products[2], 'quantity': 1}]})
+        ids = await cart_item_ids(user)
+        await user.put('/cart/remove_one_item', json={'cart_item_id': ids[0], 'amount': 1})
+        await user.request('DELETE', '/cart/delete_product', json={'cart_item_id': ids[1]})
+        await user.delete('/cart/delete_all_items')
+
+    assert statements
+    assert table_scans(statements) == []
+
+
+async def test_payment_queries_use_indexes(make_client, products):
+    user = await make_client('user@shop.com', balance=1000)
+    await user.post('/cart/add_products_to_cart', json={'items': [{'product_id': product_id, 'quantity': 1} for product_id in products[:5]]})
+    ids = await cart_item_ids(user)
+
+    with captured() as statements:
+        assert (await user.put('/payment/pay_for_one_item', json={'cart_item_id': ids[0]})).status_code == 200
+        assert (await user.put('/payment/pay_for_selected_items', json={'cart_item_ids': ids[1:3]})).status_code == 200
+        assert (await user.put('/payment/pay_for_all_items')).status_code == 200
+        await user.get('/orders/get_history')
+
+    assert statements
+    assert table_scans(statements) == []
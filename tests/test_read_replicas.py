@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from conftest import PASSWORD
+
+
+# Replicas are configured at import time, so the app runs in its own interpreter with
+# DATABASE_READ_URLS pointing at two more SQLite files. Each file holds one product named
+# after it, which shows where every catalog read was served from
+SCRIPT = '''
+import asyncio
+import json
+
+import httpx
+
+from main import app
+from backend.database.database import Base, engine, read_engines, new_session, read_sessions
+from backend.models.models import CategoryModel, ProductModel
+from backend.services.catalog_cache import catalog_cache
+
+
+async def seed(make_session, bind, name):
+    async with bind.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with make_session() as session:
+        category = CategoryModel(name='Food')
+        session.add(category)
+        await session.flush()
+        session.add(ProductModel(name=name, price=1.0, image_path='/static/x.jpg', category_id=category.id))
+        await session.commit()
+
+
+async def main():
+    await seed(new_session, engine, 'primary')
+    for index, make_session in enumerate(read_sessions):
+        await seed(make_session, read_engines[index], f'replica {index + 1}')
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://testserver')
+
+    async def served_by():
+        catalog_cache.clear()
+        response = await client.get('/category/product/get_products')
+        return response.json()['items'][0]['name']
+
+    anonymous = [await served_by() for _ in range(4)]
+
+    await client.post('/users/sign_up', json={'email': 'user@shop.com', 'password': PASSWORD, 'repeat_password': PASSWORD, 'name': 'Tester'})
+    after_write = await served_by()
+    cookie = client.cookies.get('read_primary')
+
+    client.cookies.delete('read_primary')
+    after_cookie_expired = await served_by()
+
+    print(json.dumps({'anonymous': anonymous, 'after_write': after_write, 'cookie': cookie, 'after_cookie_expired': after_cookie_expired}))
+    await client.aclose()
+
+
+asyncio.run(main())
+'''
+
+
+def test_reads_rotate_over_replicas_and_stick_to_the_primary_after_a_write():
+    directory = tempfile.mkdtemp(prefix='shop-replicas-')
+    env = {
+        **os.environ,
+        'DATABASE_URL': f'sqlite+aiosqlite:///{directory}/primary.db',
+        'DATABASE_READ_URLS': f'sqlite+aiosqlite:///{directory}/replica1.db,sqlite+aiosqlite:///{directory}/replica2.db',
+        'DB_READ_STRATEGY': 'round_robin',
+    }
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    result = subprocess.run(
+        [sys.executable, '-c', f'PASSWORD = {PASSWORD!r}\n' + SCRIPT],
+        cwd=root, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    served = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert served['anonymous'] == ['replica 1', 'replica 2', 'replica 1', 'replica 2']
+#   The sign-up set the read-your-writes cookie, so the next read went to the primary
+    assert served['cookie'] == '1'
+    assert served['after_write'] == 'primary'
+    assert served['after_cookie_expired'] in ('replica 1', 'replica 2')
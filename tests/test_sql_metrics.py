@@ -0,0 +1,48 @@
+import pytest
+from fastapi.routing import APIRoute
+from sqlalchemy import select
+
+from main import app
+from backend.database.database import session_dep
+from backend.services.sql_metrics import query_budget
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_server_timing_reports_statements(make_client, products):
+    user = await make_client('user@shop.com')
+
+    response = await user.get('/cart/get_info')
+    assert response.status_code == 200
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    assert 'desc="1 statements"' in response.headers['Server-Timing']
+
+
+async def test_route_over_its_budget_fails_in_strict_mode(make_client):
+    user = await make_client('user@shop.com')
+
+    async def two_statements(session: session_dep):
+        await session.execute(select(1))
+        await session.execute(select(2))
+        return {'success': True}
+
+#   Ahead of the static mount at "/", which would match anything
+    route = APIRoute('/test/over_budget', two_statements, dependencies=[query_budget(1)])
+    app.router.routes.insert(0, route)
+    try:
+        response = await user.get('/test/over_budget')
+    finally:
+        app.router.routes.remove(route)
+
+    assert response.status_code == 500
+    assert response.json()['detail'] == 'Query budget exceeded on GET /test/over_budget: 2 statements, budget 1'
+
+
+async def test_streamed_export_has_no_server_timing(make_client, products):
+    admin = await make_client('admin@shop.com', admin=True)
+
+    response = await admin.get('/category/product/export')
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == len(products)
+    assert 'Server-Timing' not in response.headers